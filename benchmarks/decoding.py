@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Measure CPU time spent decoding activity history pages and PGCRs
+
+Payloads are built from the fake Bungie server's synthetic clan and padded
+with the per-player stats Bungie includes, so their size is close to real
+responses. Each decoder is timed on the raw bytes, with and without reducing
+the result down to the fields the bot reads.
+
+    python -m benchmarks.decoding --iterations 200
+"""
+import argparse
+import json
+import time
+
+from benchmarks.fake_bungie import FakeWorld, bungie_response
+from seraphsix.decoding import orjson
+from seraphsix.models.destiny import reduce_activity, reduce_pgcr
+
+STAT_NAMES = [
+    'assists', 'score', 'kills', 'averageScorePerKill', 'deaths', 'averageScorePerLife', 'completed',
+    'opponentsDefeated', 'efficiency', 'killsDeathsRatio', 'killsDeathsAssists', 'activityDurationSeconds',
+    'completionReason', 'fireteamId', 'startSeconds', 'timePlayedSeconds', 'playerCount', 'teamScore'
+]
+
+WEAPON_STAT_NAMES = ['uniqueWeaponKills', 'uniqueWeaponPrecisionKills', 'uniqueWeaponKillsPrecisionKills']
+EXTENDED_STAT_NAMES = ['precisionKills', 'weaponKillsGrenade', 'weaponKillsMelee', 'weaponKillsSuper']
+
+
+def stat(value):
+    return {'statId': 'stat', 'basic': {'value': float(value), 'displayValue': str(value)}}
+
+
+def padded_pgcr(world, instance_id):
+    pgcr = world.pgcr(instance_id)
+    for entry in pgcr['entries']:
+        entry['values'].update({name: stat(i) for i, name in enumerate(STAT_NAMES) if name not in entry['values']})
+        entry['player'].update({'characterLevel': 50, 'lightLevel': 1310, 'emblemHash': 1234567890})
+        entry['extended'] = {
+            'weapons': [
+                {'referenceId': 1000 + i, 'values': {name: stat(i) for name in WEAPON_STAT_NAMES}}
+                for i in range(4)
+            ],
+            'values': {name: stat(i) for i, name in enumerate(EXTENDED_STAT_NAMES)}
+        }
+    return bungie_response(pgcr)
+
+
+def padded_history(world, character_id, count):
+    history = world.activity_history(character_id, count, 0)
+    for activity in history['activities']:
+        activity['values'] = {name: stat(i) for i, name in enumerate(STAT_NAMES)}
+    return bungie_response(history)
+
+
+def time_decoder(payload, loads, reduce, iterations):
+    started = time.process_time()
+    for _ in range(iterations):
+        reduce(loads(payload)['Response'])
+    return (time.process_time() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--count', type=int, default=250, help="Activities per history page")
+    args = parser.parse_args()
+
+    world = FakeWorld(members=100, games=20000)
+    busiest_game = max(world.games.values(), key=lambda game: len(game['players']))
+    busiest_character = max(world.history, key=lambda character_id: len(world.history[character_id]))
+
+    payloads = {
+        'pgcr': (
+            json.dumps(padded_pgcr(world, busiest_game['instance_id'])).encode('utf-8'),
+            reduce_pgcr
+        ),
+        'history': (
+            json.dumps(padded_history(world, busiest_character, args.count)).encode('utf-8'),
+            lambda response: [reduce_activity(activity) for activity in response['activities']]
+        ),
+    }
+
+    decoders = {'json': json.loads}
+    if orjson:
+        decoders['orjson'] = orjson.loads
+
+    for name, (payload, reduce) in payloads.items():
+        print(f"{name}: {len(payload)} bytes")
+        for decoder_name, loads in decoders.items():
+            decode_only = time_decoder(payload, loads, lambda response: response, args.iterations)
+            decode_reduce = time_decoder(payload, loads, reduce, args.iterations)
+            print(
+                f"  {decoder_name:<8} decode {decode_only * 1000:8.3f} ms  "
+                f"decode+reduce {decode_reduce * 1000:8.3f} ms"
+            )
+
+
+if __name__ == '__main__':
+    main()
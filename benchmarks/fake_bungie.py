@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Bungie.net endpoints used by the bot
+
+Serves a synthetic clan whose members share games, or recorded responses
+from a directory of JSON files, with configurable latency, throttling and
+maintenance so ingestion can be benchmarked without touching Bungie.
+
+    python -m benchmarks.fake_bungie --members 100 --games 5000 --latency 0.2
+
+Recordings are JSON files of the form {"path": "/Platform/...", "response": {...}},
+matched against the request path and query string before any synthetic route.
+Maintenance can be toggled while running with POST /fake/maintenance?enabled=1,
+and GET /fake/stats returns request, error and byte counts and percentiles of
+the injected latency. benchmarks.ingest times the bot's own ingestion runs against
+this server.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+
+from aiohttp import web
+from datetime import datetime, timedelta
+from pathlib import Path
+from seraphsix import constants
+
+log = logging.getLogger(__name__)
+
+CLAN_ID = 1234567
+MEMBER_ID_BASE = 4611686018400000000
+CHARACTER_ID_BASE = 2305843009300000000
+INSTANCE_ID_BASE = 7000000000
+CHARACTERS_PER_MEMBER = 3
+
+ERROR_SUCCESS = 1
+ERROR_SYSTEM_DISABLED = 5
+ERROR_THROTTLED = 36
+
+
+def bungie_response(response, error_code=ERROR_SUCCESS, error_status='Success', throttle_seconds=0):
+    return {
+        'Response': response,
+        'ErrorCode': error_code,
+        'ThrottleSeconds': throttle_seconds,
+        'ErrorStatus': error_status,
+        'Message': 'Ok' if error_code == ERROR_SUCCESS else error_status,
+        'MessageData': {}
+    }
+
+
+def bungie_date(date):
+    return date.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def activity_modes(mode):
+    """List a mode along with the parent modes Bungie reports for it"""
+    parents = [
+        mode_filter for mode_filter, modes in constants.HISTORY_MODE_FILTERS.items()
+        if mode in modes and mode_filter != mode
+    ]
+    return [mode] + parents
+
+
+class FakeWorld(object):
+    """A deterministic clan of members whose characters played games together
+
+    A share of the games can be in modes the bot doesn't track, like patrol
+    and story missions, as real activity histories are.
+    """
+
+    def __init__(self, members=100, games=5000, days=30, platform_id=constants.PLATFORM_STEAM, seed=0,
+                 unsupported_share=0.0):
+        self.platform_id = platform_id
+        self.now = datetime.utcnow().replace(microsecond=0)
+        rng = random.Random(seed)
+
+        self.members = [MEMBER_ID_BASE + i for i in range(members)]
+        self.characters = {
+            member_id: [CHARACTER_ID_BASE + i * CHARACTERS_PER_MEMBER + j for j in range(CHARACTERS_PER_MEMBER)]
+            for i, member_id in enumerate(self.members)
+        }
+        self.history = {
+            character_id: [] for character_ids in self.characters.values() for character_id in character_ids
+        }
+
+        modes = sorted(set(sum(constants.SUPPORTED_GAME_MODES.values(), [])))
+        unsupported_modes = [constants.MODE_PATROL, constants.MODE_STORY, constants.MODE_SOCIAL]
+        self.games = {}
+        for i in range(games):
+            instance_id = INSTANCE_ID_BASE + i
+            period = self.now - timedelta(seconds=rng.randint(0, days * constants.TIME_HOUR_SECONDS * 24))
+            players = rng.sample(self.members, min(len(self.members), rng.randint(1, 6)))
+            mode = rng.choice(modes)
+            if unsupported_share and rng.random() < unsupported_share:
+                mode = rng.choice(unsupported_modes)
+            game = {
+                'instance_id': instance_id,
+                'mode': mode,
+                'reference_id': rng.randint(1, 2 ** 32),
+                'period': bungie_date(period),
+                'players': [(member_id, rng.choice(self.characters[member_id])) for member_id in players],
+                'duration': rng.randint(300, 3600)
+            }
+            self.games[instance_id] = game
+            for _, character_id in game['players']:
+                self.history[character_id].append(game)
+
+        for games in self.history.values():
+            games.sort(key=lambda game: game['period'], reverse=True)
+
+    def last_played(self, character_id):
+        games = self.history[character_id]
+        return games[0]['period'] if games else bungie_date(self.now - timedelta(days=365))
+
+    def user_info(self, member_id):
+        return {
+            'membershipType': self.platform_id,
+            'membershipId': str(member_id),
+            'displayName': f"Guardian{member_id - MEMBER_ID_BASE}"
+        }
+
+    def profile(self, member_id):
+        return {
+            'characters': {
+                'data': {
+                    str(character_id): {
+                        'membershipId': str(member_id),
+                        'membershipType': self.platform_id,
+                        'characterId': str(character_id),
+                        'dateLastPlayed': self.last_played(character_id)
+                    }
+                    for character_id in self.characters[member_id]
+                },
+                'privacy': 1
+            }
+        }
+
+    def activity_history(self, character_id, count, page, mode=None):
+        games = self.history.get(character_id, [])
+        if mode:
+            games = [game for game in games if mode in activity_modes(game['mode'])]
+        games = games[page * count:(page + 1) * count]
+        if not games:
+            # Like Bungie, leave the key out once there are no more pages
+            return {}
+        return {
+            'activities': [
+                {
+                    'period': game['period'],
+                    'activityDetails': {
+                        'referenceId': game['reference_id'],
+                        'directorActivityHash': game['reference_id'],
+                        'instanceId': str(game['instance_id']),
+                        'mode': game['mode'],
+                        'modes': activity_modes(game['mode']),
+                        'isPrivate': False,
+                        'membershipType': self.platform_id
+                    },
+                    'values': {}
+                }
+                for game in games
+            ]
+        }
+
+    def account_stats(self, member_id):
+        def entered(games):
+            return {'allTime': {'activitiesEntered': {'basic': {'value': float(games), 'displayValue': str(games)}}}}
+
+        characters = []
+        for character_id in self.characters[member_id]:
+            games = self.history[character_id]
+            pvp = sum(game['mode'] in constants.MODES_PVP for game in games)
+            characters.append({
+                'characterId': str(character_id),
+                'deleted': False,
+                'results': {'allPvE': entered(len(games) - pvp), 'allPvP': entered(pvp)},
+                'merged': {}
+            })
+        return {'mergedDeletedCharacters': {}, 'mergedAllCharacters': {}, 'characters': characters}
+
+    def pgcr(self, instance_id):
+        game = self.games.get(instance_id)
+        if not game:
+            return None
+        return {
+            'period': game['period'],
+            'activityDetails': {
+                'referenceId': game['reference_id'],
+                'directorActivityHash': game['reference_id'],
+                'instanceId': str(instance_id),
+                'mode': game['mode'],
+                'modes': activity_modes(game['mode']),
+                'isPrivate': False,
+                'membershipType': self.platform_id
+            },
+            'entries': [
+                {
+                    'standing': 0,
+                    'player': {'destinyUserInfo': self.user_info(member_id), 'characterClass': 'Hunter'},
+                    'characterId': str(character_id),
+                    'values': {
+                        'completed': {'basic': {'value': 1.0, 'displayValue': 'Yes'}},
+                        'timePlayedSeconds': {
+                            'basic': {'value': float(game['duration']), 'displayValue': f"{game['duration']}s"}
+                        }
+                    }
+                }
+                for member_id, character_id in game['players']
+            ],
+            'teams': []
+        }
+
+    def group_members(self, page, page_size=100):
+        members = self.members[(page - 1) * page_size:page * page_size]
+        return {
+            'results': [
+                {
+                    'memberType': constants.CLAN_MEMBER_MEMBER if i else constants.CLAN_MEMBER_ADMIN,
+                    'isOnline': False,
+                    'lastOnlineStatusChange': str(int(self.now.timestamp())),
+                    'groupId': str(CLAN_ID),
+                    'destinyUserInfo': self.user_info(member_id),
+                    'joinDate': bungie_date(self.now - timedelta(days=400))
+                }
+                for i, member_id in enumerate(members)
+            ],
+            'totalResults': len(self.members),
+            'hasMore': page * page_size < len(self.members)
+        }
+
+    def group(self):
+        return {
+            'detail': {
+                'groupId': str(CLAN_ID),
+                'name': 'Fake Clan',
+                'memberCount': len(self.members),
+                'creationDate': bungie_date(self.now - timedelta(days=1000)),
+                'motto': 'Benchmarking',
+                'about': 'A synthetic clan',
+                'clanInfo': {'clanCallsign': 'FAKE'}
+            },
+            'founder': {'destinyUserInfo': self.user_info(self.members[0])}
+        }
+
+
+class FakeBungie(object):
+    """aiohttp application serving a FakeWorld with injected latency, throttling and maintenance"""
+
+    def __init__(self, world, latency=0.0, jitter=0.0, throttle_rate=0.0, throttle_seconds=1,
+                 maintenance=False, recordings=None, seed=0):
+        self.world = world
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.throttle_seconds = throttle_seconds
+        self.maintenance = maintenance
+        self.recordings = recordings or {}
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.sent = 0
+        self.latencies = []
+
+        self.app = web.Application(middlewares=[self.inject])
+        self.app.add_routes([
+            web.get('/Platform/Destiny2/Manifest', self.manifest),
+            web.get('/Platform/Destiny2/Manifest/', self.manifest),
+            web.get('/Platform/Destiny2/{platform_id}/Profile/{member_id}/', self.profile),
+            web.get('/Platform/Destiny2/{platform_id}/Account/{member_id}/Stats/', self.account_stats),
+            web.get(
+                '/Platform/Destiny2/{platform_id}/Account/{member_id}/Character/{character_id}/Stats/Activities/',
+                self.activity_history),
+            web.get('/Platform/Destiny2/Stats/PostGameCarnageReport/{instance_id}/', self.pgcr),
+            web.get('/Platform/GroupV2/{group_id}/Members/', self.group_members),
+            web.get('/Platform/GroupV2/{group_id}/', self.group),
+            web.get('/Platform/User/GetMembershipsById/{member_id}/{platform_id}/', self.memberships),
+            web.post('/fake/maintenance', self.set_maintenance),
+            web.get('/fake/stats', self.stats),
+        ])
+
+    @staticmethod
+    def load_recordings(directory):
+        recordings = {}
+        for path in Path(directory).glob('*.json'):
+            with open(path) as f:
+                recording = json.load(f)
+            recordings[recording['path']] = recording['response']
+        return recordings
+
+    @web.middleware
+    async def inject(self, request, handler):
+        if request.path.startswith('/fake/'):
+            return await handler(request)
+
+        self.requests += 1
+        try:
+            response = await self.respond(request, handler)
+        except web.HTTPException:
+            self.errors += 1
+            raise
+        if response.status >= 300:
+            self.errors += 1
+        self.sent += len(response.body)
+        return response
+
+    async def respond(self, request, handler):
+        delay = max(0.0, self.rng.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+        if delay:
+            await asyncio.sleep(delay)
+        self.latencies.append(delay)
+
+        if self.maintenance:
+            return web.json_response(
+                bungie_response({}, ERROR_SYSTEM_DISABLED, 'SystemDisabled'), status=503)
+
+        if self.throttle_rate and self.rng.random() < self.throttle_rate:
+            self.throttled += 1
+            return web.json_response(bungie_response(
+                {}, ERROR_THROTTLED, 'ThrottleLimitExceededMomentarily', self.throttle_seconds))
+
+        recorded = self.recordings.get(request.path_qs) or self.recordings.get(request.path)
+        if recorded is not None:
+            return web.json_response(recorded)
+        return await handler(request)
+
+    async def manifest(self, request):
+        return web.json_response(bungie_response({'version': 'fake'}))
+
+    async def profile(self, request):
+        member_id = int(request.match_info['member_id'])
+        if member_id not in self.world.characters:
+            raise web.HTTPNotFound()
+        return web.json_response(bungie_response(self.world.profile(member_id)))
+
+    async def activity_history(self, request):
+        character_id = int(request.match_info['character_id'])
+        count = int(request.query.get('count', 25))
+        page = int(request.query.get('page', 0))
+        mode = request.query.get('mode')
+        mode = int(mode) if mode and mode != 'None' else None
+        return web.json_response(bungie_response(self.world.activity_history(character_id, count, page, mode)))
+
+    async def account_stats(self, request):
+        member_id = int(request.match_info['member_id'])
+        if member_id not in self.world.characters:
+            raise web.HTTPNotFound()
+        return web.json_response(bungie_response(self.world.account_stats(member_id)))
+
+    async def pgcr(self, request):
+        pgcr = self.world.pgcr(int(request.match_info['instance_id']))
+        if not pgcr:
+            raise web.HTTPNotFound()
+        return web.json_response(bungie_response(pgcr))
+
+    async def group_members(self, request):
+        page = int(request.query.get('currentPage', 1))
+        return web.json_response(bungie_response(self.world.group_members(page)))
+
+    async def group(self, request):
+        return web.json_response(bungie_response(self.world.group()))
+
+    async def memberships(self, request):
+        member_id = int(request.match_info['member_id'])
+        return web.json_response(bungie_response({
+            'destinyMemberships': [self.world.user_info(member_id)],
+            'bungieNetUser': {'membershipId': str(member_id), 'displayName': 'Guardian'}
+        }))
+
+    async def set_maintenance(self, request):
+        self.maintenance = request.query.get('enabled', '1') not in ('0', 'false')
+        return web.json_response({'maintenance': self.maintenance})
+
+    async def stats(self, request):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+        return web.json_response({
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'bytes': self.sent,
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99)
+        })
+
+
+def point_pydest_at(base_url):
+    """Rewrite Pydest's Bungie.net URLs to point at the fake server"""
+    from pydest import api
+
+    for name, value in vars(api).items():
+        if isinstance(value, str) and value.startswith('https://www.bungie.net'):
+            setattr(api, name, value.replace('https://www.bungie.net', base_url.rstrip('/'), 1))
+
+
+def create_fake_destiny(base_url):
+    """Create a Pydest client whose requests go to the fake server"""
+    from pydest.pydest import Pydest
+
+    point_pydest_at(base_url)
+    return Pydest(api_key='fake', client_id='fake', client_secret='fake')
+
+
+def set_bungie_rate(rate):
+    """Let `rate` requests per second through the bot's Bungie rate limiter, as the fake server has no limit"""
+    from seraphsix.tasks.activity import bungie_limiter
+
+    bungie_limiter.rate = rate
+    bungie_limiter.endpoint_rates = {endpoint: rate for endpoint in bungie_limiter.endpoint_rates}
+
+
+async def serve(fake, host='127.0.0.1', port=8080):
+    """Serve a FakeBungie from the running event loop and return its runner and base URL"""
+    runner = web.AppRunner(fake.app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--members', type=int, default=100)
+    parser.add_argument('--games', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--unsupported-share', type=float, default=0.0, help="Fraction of games in untracked modes")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Standard deviation of the latency")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests to throttle")
+    parser.add_argument('--throttle-seconds', type=int, default=1)
+    parser.add_argument('--maintenance', action='store_true')
+    parser.add_argument('--recordings', help="Directory of recorded responses to serve")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=constants.LOG_FORMAT_MSG)
+
+    world = FakeWorld(args.members, args.games, args.days, seed=args.seed, unsupported_share=args.unsupported_share)
+    recordings = FakeBungie.load_recordings(args.recordings) if args.recordings else None
+    fake = FakeBungie(
+        world, args.latency, args.jitter, args.throttle_rate, args.throttle_seconds,
+        args.maintenance, recordings, args.seed
+    )
+    log.info(f"Serving {args.members} members and {args.games} games on {args.host}:{args.port}")
+    web.run_app(fake.app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
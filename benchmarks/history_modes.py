@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Compare activity history pages and bytes fetched per member with and without mode filters
+
+Every character's history in the fake Bungie server's synthetic clan is read
+from the fake server with the bot's own history functions: one unfiltered
+get_activity_history walk, one get_activity_history walk per mode filter in
+HISTORY_MODE_FILTERS, and get_character_activities, which plans the walks the
+way scans do. Full scans read the whole history, and incremental scans are
+given a cursor from --window hours ago. Pages and bytes are counted by the
+fake server.
+
+Requests go through the bot's rate limiter, so a Redis server is needed.
+
+    python -m benchmarks.history_modes --unsupported-share 0.5
+"""
+import aioredis
+import argparse
+import asyncio
+
+from benchmarks.fake_bungie import FakeBungie, FakeWorld, bungie_date, create_fake_destiny, serve, set_bungie_rate
+from collections import namedtuple
+from datetime import timedelta
+from seraphsix import constants
+from seraphsix.cogs.utils.helpers import bungie_date_as_utc
+from seraphsix.tasks.activity import get_activity_history, get_character_activities
+
+Cursor = namedtuple('Cursor', ['instance_id', 'date'])
+
+
+async def read_unfiltered(destiny, redis, platform_id, member_id, char_id, count, cursor=None):
+    activities, _ = await get_activity_history(
+        destiny, redis, platform_id, member_id, char_id, count=count, cursor=cursor)
+    return activities
+
+
+async def read_filtered(destiny, redis, platform_id, member_id, char_id, count, cursor=None):
+    activities = []
+    for mode in constants.HISTORY_MODE_FILTERS.keys():
+        mode_activities, _ = await get_activity_history(
+            destiny, redis, platform_id, member_id, char_id, count=count, cursor=cursor, mode=mode)
+        activities.extend(mode_activities)
+    return activities
+
+
+STRATEGIES = {
+    'unfiltered': read_unfiltered,
+    'mode filters': read_filtered,
+    'planned': get_character_activities,
+}
+
+
+async def scan_members(fake, destiny, redis, read, count, cursor=None):
+    world = fake.world
+    requests, sent = fake.requests, fake.sent
+    found = 0
+    for member_id, character_ids in world.characters.items():
+        for character_id in character_ids:
+            activities = await read(destiny, redis, world.platform_id, member_id, character_id, count, cursor)
+            found += len({activity['activityDetails']['instanceId'] for activity in activities})
+    members = len(world.members)
+    return (fake.requests - requests) / members, (fake.sent - sent) / members, found / members
+
+
+async def run(args):
+    world = FakeWorld(args.members, args.games, args.days, unsupported_share=args.unsupported_share)
+    fake = FakeBungie(world)
+    runner, base_url = await serve(fake, port=args.port)
+    destiny = create_fake_destiny(base_url)
+    redis = await aioredis.create_redis_pool(args.redis_url)
+    set_bungie_rate(args.rate)
+
+    # A cursor on no particular game, only its date is ever reached
+    cursor = Cursor(0, bungie_date_as_utc(bungie_date(world.now - timedelta(hours=args.window))))
+
+    print(f"{'scan':<12} {'strategy':<13} {'pages/member':>13} {'KB/member':>11} {'games/member':>13}")
+    try:
+        for scan, scan_cursor in [('full', None), ('incremental', cursor)]:
+            for strategy, read in STRATEGIES.items():
+                pages, size, found = await scan_members(fake, destiny, redis, read, args.count, scan_cursor)
+                print(f"{scan:<12} {strategy:<13} {pages:13.1f} {size / 1024:11.1f} {found:13.1f}")
+    finally:
+        await destiny.close()
+        redis.close()
+        await redis.wait_closed()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--games', type=int, default=20000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--count', type=int, default=250, help="Activities per history page")
+    parser.add_argument('--unsupported-share', type=float, default=0.5, help="Fraction of games in untracked modes")
+    parser.add_argument('--window', type=int, default=1, help="Hours covered by an incremental scan")
+    parser.add_argument('--port', type=int, default=8080, help="Port to serve the fake Bungie server on")
+    parser.add_argument('--redis-url', default='redis://localhost')
+    parser.add_argument('--rate', type=float, default=1000, help="Requests per second allowed by the rate limiter")
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
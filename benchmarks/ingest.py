@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Time the bot's member sync, last active and game ingestion runs against the fake Bungie server
+
+The fake server is served in process and Pydest is pointed at it, then
+member_sync, the last active job and store_all_games are run in turn for
+--rounds rounds, as the bot's scheduled tasks would run them. Each call is
+timed as a whole, so the reported latencies include the rate limiter,
+scheduler, caches and database writes along with the injected Bungie latency.
+The run fails if any request got an error response, as the fake server doesn't
+serve every endpoint the bot could call.
+
+The database and Redis server come from the bot's usual configuration and
+should be scratch copies: the fake clan is added to --guild-id on the first
+run and its members and games are written like any other clan's.
+
+    python -m benchmarks.ingest --members 100 --games 5000 --latency 0.2 --rounds 3
+"""
+import aiohttp
+import aioredis
+import argparse
+import asyncio
+import logging
+
+from benchmarks.fake_bungie import CLAN_ID, FakeBungie, FakeWorld, point_pydest_at, serve, set_bungie_rate
+from peewee import DoesNotExist
+from seraphsix import constants
+from seraphsix.database import Clan, Guild
+from seraphsix.tasks.activity import store_all_games
+from seraphsix.tasks.clan import member_sync
+from seraphsix.tasks.config import Config
+from seraphsix.tasks.jobs import run_last_active
+from seraphsix.worker import SeraphSixWorker
+
+log = logging.getLogger(__name__)
+
+
+def percentile(durations, p):
+    durations = sorted(durations)
+    return durations[min(len(durations) - 1, int(len(durations) * p))]
+
+
+async def add_fake_clan(database, guild_id, platform_id):
+    try:
+        guild_db = await database.get(Guild, guild_id=guild_id)
+    except DoesNotExist:
+        guild_db = await database.create(Guild, guild_id=guild_id)
+    try:
+        await database.get(Clan, clan_id=CLAN_ID)
+    except DoesNotExist:
+        await database.create(
+            Clan, clan_id=CLAN_ID, guild=guild_db, name='Fake Clan', callsign='FAKE', platform=platform_id)
+
+
+async def run(args):
+    world = FakeWorld(args.members, args.games, args.days, seed=args.seed, unsupported_share=args.unsupported_share)
+    fake = FakeBungie(world, args.latency, args.jitter, args.throttle_rate, args.throttle_seconds, seed=args.seed)
+    runner, base_url = await serve(fake, port=args.port)
+
+    config = Config()
+    # Run every step inline rather than queueing it for a worker
+    config.enable_job_queue = False
+    bot = SeraphSixWorker(config)
+    point_pydest_at(base_url)
+    bot.redis = await aioredis.create_redis_pool(config.redis_url)
+    if args.rate:
+        set_bungie_rate(args.rate)
+
+    steps = {
+        'member_sync': lambda: member_sync(bot, args.guild_id),
+        'last_active': lambda: run_last_active(bot, args.guild_id),
+        'store_all_games': lambda: store_all_games(bot, args.guild_id, full_rescan=args.full_rescan),
+    }
+    durations = {name: [] for name in steps.keys()}
+    requests = {name: 0 for name in steps.keys()}
+
+    loop = asyncio.get_event_loop()
+    try:
+        await add_fake_clan(bot.database, args.guild_id, world.platform_id)
+        for round_number in range(args.rounds):
+            for name, step in steps.items():
+                before = fake.requests
+                started = loop.time()
+                await step()
+                durations[name].append(loop.time() - started)
+                requests[name] += fake.requests - before
+                log.info(f"Round {round_number + 1} {name} took {durations[name][-1]:0.2f} seconds")
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base_url}/fake/stats") as response:
+                stats = await response.json()
+    finally:
+        await bot.destiny.close()
+        await bot.http_clients.close()
+        await bot.database.close()
+        bot.redis.close()
+        await bot.redis.wait_closed()
+        await runner.cleanup()
+
+    print(f"{'step':<16} {'p50 s':>8} {'p95 s':>8} {'max s':>8} {'requests/round':>15}")
+    for name, step_durations in durations.items():
+        print(
+            f"{name:<16} {percentile(step_durations, 0.5):8.2f} {percentile(step_durations, 0.95):8.2f} "
+            f"{max(step_durations):8.2f} {requests[name] / args.rounds:15.1f}"
+        )
+    print(f"{stats['throttled']} of {stats['requests']} requests were throttled")
+
+    # Failed requests are retried and slow the client down, so the timings would measure the fake server's gaps
+    assert stats['errors'] == 0, f"{stats['errors']} requests got an error response from the fake server"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guild-id', type=int, default=1, help="Discord server id to add the fake clan to")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--full-rescan', action='store_true', help="Scan every member's whole history each round")
+    parser.add_argument('--port', type=int, default=8080, help="Port to serve the fake Bungie server on")
+    parser.add_argument('--rate', type=float, help="Requests per second allowed by the rate limiter")
+    parser.add_argument('--members', type=int, default=100)
+    parser.add_argument('--games', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--unsupported-share', type=float, default=0.0, help="Fraction of games in untracked modes")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Standard deviation of the latency")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests to throttle")
+    parser.add_argument('--throttle-seconds', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=constants.LOG_FORMAT_MSG)
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,7 +19,6 @@ def main():
 
     logging.getLogger('aiohttp.client').setLevel(logging.ERROR)
     logging.getLogger('aioredis').setLevel(logging.DEBUG)
-    logging.getLogger('backoff').setLevel(logging.DEBUG)
     logging.getLogger('bot').setLevel(logging.DEBUG)
     logging.getLogger('seraphsix.tasks.discord').setLevel(logging.DEBUG)
 
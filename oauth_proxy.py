@@ -8,6 +8,7 @@ import requests
 from flask import Flask, redirect, render_template, request, session, url_for
 from flask_kvsession import KVSessionExtension
 from get_docker_secret import get_docker_secret
+from http.cookiejar import DefaultCookiePolicy
 from requests_oauth2 import OAuth2, OAuth2BearerToken
 from seraphsix.constants import LOG_FORMAT_MSG
 from seraphsix.utils import UTCFormatter
@@ -39,6 +40,13 @@ class BungieClient(OAuth2):
     token_url = '/platform/app/oauth/token/'
 
 
+# One pooled session for all Bungie requests so connections are kept alive. It's
+# shared by every user, so it must never keep cookies from one user's requests
+bungie_session = requests.Session()
+bungie_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+bungie_session.headers.update({'X-API-KEY': get_docker_secret('bungie_api_key')})
+bungie_session.mount(BungieClient.site, requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=10))
+
 bungie_auth = BungieClient(
     client_id=get_docker_secret('bungie_client_id'),
     client_secret=get_docker_secret('bungie_client_secret'),
@@ -81,10 +89,10 @@ def oauth_index():
             url_for('oauth_callback')
         )
 
-    with requests.Session() as s:
-        s.auth = OAuth2BearerToken(session['access_token'])
-        s.headers.update({'X-API-KEY': get_docker_secret('bungie_api_key')})
-        r = s.get(f"{BungieClient.site}/platform/User/GetMembershipsForCurrentUser/")
+    r = bungie_session.get(
+        f"{BungieClient.site}/platform/User/GetMembershipsForCurrentUser/",
+        auth=OAuth2BearerToken(session['access_token'])
+    )
 
     r.raise_for_status()
     log.debug(f"/oauth: {session} {request.args}")
@@ -10,18 +10,23 @@ import traceback
 from discord.ext import commands, tasks
 from peewee import DoesNotExist
 from peony import PeonyClient
-from pydest.pydest import Pydest
 from the100 import The100
 
 from seraphsix import constants
+from seraphsix.clients import HttpClients, create_destiny
 from seraphsix.cogs.utils.message_manager import MessageManager
 from seraphsix.database import Database, Guild, TwitterChannel
 
 from seraphsix.errors import (
     InvalidCommandError, InvalidGameModeError, InvalidMemberError,
-    NotRegisteredError, ConfigurationError, MissingTimezoneError, MaintenanceError)
-from seraphsix.tasks.activity import store_all_games, store_last_active
+    NotRegisteredError, ConfigurationError, MissingTimezoneError, MaintenanceError,
+    CircuitOpenError)
+from seraphsix.metrics import metrics
+from seraphsix.tasks.activity import bungie_breakers, bungie_maintenance, store_all_games, store_all_last_active
+from seraphsix.tasks.backfill import history_backfill
+from seraphsix.tasks.cache import PgcrCache
 from seraphsix.tasks.discord import store_sherpas, update_sherpa
+from seraphsix.tasks.jobs import job_queue
 
 log = logging.getLogger(__name__)
 intents = discord.Intents.default()
@@ -62,18 +67,20 @@ class SeraphSix(commands.Bot):
         self.database = Database(config.database_url)
         self.database.initialize()
 
-        self.destiny = Pydest(
-            api_key=config.bungie.api_key,
-            client_id=config.bungie.client_id,
-            client_secret=config.bungie.client_secret,
-        )
+        self.http_clients = HttpClients(**config.http.asdict())
+
+        self.destiny = create_destiny(self.http_clients, config)
 
-        self.the100 = The100(config.the100.api_key, config.the100.base_url)
+        self.pgcr_cache = PgcrCache(config.pgcr_cache_size)
+
+        self.the100 = self.http_clients.adopt(
+            'the100', The100(config.the100.api_key, config.the100.base_url), 'session')
 
         self.twitter = None
         if (config.twitter.consumer_key and config.twitter.consumer_secret and
                 config.twitter.access_token and config.twitter.access_token_secret):
-            self.twitter = PeonyClient(**config.twitter.asdict())
+            self.twitter = PeonyClient(
+                **config.twitter.asdict(), session=self.http_clients.session('twitter'))
 
         for extension in STARTUP_EXTENSIONS:
             try:
@@ -90,10 +97,22 @@ class SeraphSix(commands.Bot):
 
     @tasks.loop(minutes=5.0)
     async def update_last_active(self):
-        tasks = []
+        member_dbs = []
         guilds = await self.database.execute(Guild.select())
         if not guilds:
             return
+        if not bungie_breakers.available('profile'):
+            log.info("Skipping last active dates while Bungie profile services are failing")
+            return
+
+        if self.config.enable_job_queue:
+            if not hasattr(self, 'redis'):
+                await self.connect_redis()
+            for guild in guilds:
+                await job_queue.enqueue(
+                    self.redis, 'last-active', f"last-active-{guild.guild_id}", guild_id=guild.guild_id)
+            return
+
         for guild in guilds:
             guild_id = guild.guild_id
             discord_guild = await self.fetch_guild(guild.guild_id)
@@ -103,17 +122,14 @@ class SeraphSix(commands.Bot):
                 await self.connect_redis()
 
             try:
-                tasks.extend([
-                    store_last_active(self, member)
-                    for member in await self.database.get_clan_members_by_guild_id(guild_id)
-                ])
+                member_dbs.extend(await self.database.get_clan_members_by_guild_id(guild_id))
             except AttributeError:
                 log.exception("Redis connection not found")
                 await self.log_channel.send("Redis connection not found")
                 break
 
         try:
-            await asyncio.gather(*tasks)
+            await store_all_last_active(self, member_dbs)
         except MaintenanceError as e:
             if not self.bungie_maintenance:
                 log.info(f"Bungie maintenance is ongoing: {e}")
@@ -137,7 +153,16 @@ class SeraphSix(commands.Bot):
         if not guilds:
             return
 
-        tasks = [store_all_games(self, guild.guild_id) for guild in guilds]
+        if self.config.enable_job_queue:
+            for guild in guilds:
+                await job_queue.enqueue(
+                    self.redis, 'store-games', f"store-games-{guild.guild_id}", guild_id=guild.guild_id)
+            await job_queue.record(self.redis)
+            metrics.log()
+            return
+
+        importing = await history_backfill.pending(self.redis)
+        tasks = [store_all_games(self, guild.guild_id, skip_member_ids=importing) for guild in guilds]
         try:
             await asyncio.gather(*tasks)
         except MaintenanceError as e:
@@ -149,6 +174,9 @@ class SeraphSix(commands.Bot):
                 self.bungie_maintenance = False
                 log.info("Bungie maintenance has ended")
 
+        self.http_clients.record()
+        metrics.log()
+
     @update_member_games.before_loop
     async def before_update_member_games(self):
         await self.wait_until_ready()
@@ -194,6 +222,9 @@ class SeraphSix(commands.Bot):
 
     async def on_ready(self):
         await self.connect_redis()
+        await bungie_maintenance.start(self.redis, self.destiny)
+        if not self.config.enable_job_queue:
+            await history_backfill.start(self)
 
         self.log_channel = self.get_channel(self.config.log_channel)
         self.reg_channel = self.get_channel(self.config.reg_channel)
@@ -230,7 +261,7 @@ class SeraphSix(commands.Bot):
         elif isinstance(error, (
             ConfigurationError, InvalidCommandError, InvalidMemberError,
             InvalidGameModeError, NotRegisteredError, MissingTimezoneError,
-            MaintenanceError
+            MaintenanceError, CircuitOpenError
         )):
             text = error
         elif isinstance(error, commands.CommandNotFound):
@@ -286,4 +317,5 @@ class SeraphSix(commands.Bot):
         await self.the100.close()
         if self.twitter:
             await self.twitter.close()
+        await self.http_clients.close()
         await super().close()
@@ -0,0 +1,110 @@
+import aiohttp
+import logging
+import ssl
+
+from pydest.pydest import Pydest
+from seraphsix import constants
+from seraphsix.decoding import FastJSONResponse
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class HttpClients(object):
+    """Factory for pooled aiohttp sessions, one connection pool per upstream
+
+    Every pool caches DNS lookups and keeps idle connections alive, and all of
+    them share one TLS context so TLS sessions can be resumed. Connections
+    created and reused are counted per upstream, and `record` publishes how
+    many connections are open and idle.
+    """
+
+    def __init__(self, limit=constants.HTTP_MAX_CONNECTIONS,
+                 limit_per_host=constants.HTTP_MAX_CONNECTIONS_PER_HOST,
+                 keepalive_timeout=constants.HTTP_KEEPALIVE_TIMEOUT,
+                 dns_cache_ttl=constants.HTTP_DNS_CACHE_TTL):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.ssl_context = ssl.create_default_context()
+        self.sessions = {}
+
+    def _trace_config(self, name):
+        async def on_connection_create_end(session, context, params):
+            metrics.incr(f"http.{name}.created")
+
+        async def on_connection_reuseconn(session, context, params):
+            metrics.incr(f"http.{name}.reused")
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def session(self, name, **kwargs):
+        """Get the pooled session for an upstream, creating it on first use"""
+        if name not in self.sessions:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+                ssl=self.ssl_context
+            )
+            self.sessions[name] = aiohttp.ClientSession(
+                connector=connector, trace_configs=[self._trace_config(name)], **kwargs)
+        return self.sessions[name]
+
+    def adopt(self, name, client, *attributes, **kwargs):
+        """Swap the session a client library created for itself for the pooled one
+
+        For libraries that don't accept a session, each named attribute holding
+        an aiohttp session is replaced. The client's own session is detached
+        rather than closed since it hasn't opened any connections yet.
+        """
+        session = self.session(name, **kwargs)
+        for attribute in attributes:
+            owner = client
+            path = attribute.split('.')
+            for part in path[:-1]:
+                owner = getattr(owner, part)
+            existing = getattr(owner, path[-1], None)
+            if not isinstance(existing, aiohttp.ClientSession):
+                log.warning(f"Could not find session {attribute} on {type(client).__name__}")
+                continue
+            if existing is not session:
+                existing.detach()
+            setattr(owner, path[-1], session)
+        return client
+
+    def record(self):
+        for name, session in self.sessions.items():
+            # aiohttp has no public counts of pooled connections, so these internals
+            # are only read while the installed version still has them
+            connections = getattr(session.connector, '_conns', None)
+            acquired = getattr(session.connector, '_acquired', None)
+            if not isinstance(connections, dict) or acquired is None:
+                continue
+            idle = sum(len(pooled) for pooled in connections.values())
+            metrics.gauge(f"http.{name}.idle", idle)
+            metrics.gauge(f"http.{name}.open", idle + len(acquired))
+
+    async def close(self):
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions = {}
+
+
+def create_destiny(http_clients, config):
+    """Create the Pydest client for the Bungie API on the pooled Bungie session"""
+    session_args = {}
+    if config.fast_json:
+        session_args['response_class'] = FastJSONResponse
+
+    return http_clients.adopt('bungie', Pydest(
+        api_key=config.bungie.api_key,
+        client_id=config.bungie.client_id,
+        client_secret=config.bungie.client_secret,
+    ), '_session', 'api.session', **session_args)
@@ -18,7 +18,8 @@ from seraphsix.cogs.utils.message_manager import MessageManager
 from seraphsix.cogs.utils.paginator import FieldPages, EmbedPages
 from seraphsix.database import Member, ClanMember, Clan, Guild
 from seraphsix.errors import InvalidAdminError, InvalidCommandError
-from seraphsix.tasks.activity import get_game_counts, execute_pydest
+from seraphsix.tasks.activity import get_game_counts, execute_pydest, store_all_games
+from seraphsix.tasks.backfill import history_backfill
 from seraphsix.tasks.clan import info_sync, member_sync
 
 log = logging.getLogger(__name__)
@@ -227,43 +228,37 @@ class ClanCog(commands.Cog, name="Clan"):
             return await manager.send_and_clean("No connected clans found", mention=False)
 
         embeds = []
-        clan_redis_key = f"{ctx.guild.id}-clan-info"
-        clan_info_redis = await self.bot.redis.get(clan_redis_key)
-        if clan_info_redis and '-nocache' not in args:
-            await self.bot.redis.expire(clan_redis_key, constants.TIME_HOUR_SECONDS)
-            embeds = pickle.loads(clan_info_redis)
-        else:
-            for clan_db in clan_dbs:
-                res = await execute_pydest(self.bot.destiny.api.get_group(clan_db.clan_id), self.bot.redis)
-                group = res['Response']
-                embed = discord.Embed(
-                    colour=constants.BLUE,
-                    title=group['detail']['motto'],
-                    description=group['detail']['about']
-                )
-                embed.set_author(
-                    name=f"{group['detail']['name']} [{group['detail']['clanInfo']['clanCallsign']}]",
-                    url=f"https://www.bungie.net/en/ClanV2?groupid={clan_db.clan_id}"
-                )
-                embed.add_field(
-                    name="Members",
-                    value=group['detail']['memberCount'],
-                    inline=True
-                )
-                embed.add_field(
-                    name="Founder",
-                    value=group['founder']['bungieNetUserInfo']['displayName'],
-                    inline=True
-                )
-                embed.add_field(
-                    name="Founded",
-                    value=datetime.strptime(
-                        group['detail']['creationDate'],
-                        '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%Y-%m-%d %H:%M:%S %Z'),
-                    inline=True
-                )
-                embeds.append(embed)
-            await self.bot.redis.set(clan_redis_key, pickle.dumps(embeds), expire=constants.TIME_HOUR_SECONDS)
+        for clan_db in clan_dbs:
+            res = await execute_pydest(
+                self.bot.destiny.api.get_group(clan_db.clan_id), self.bot.redis, use_cache='-nocache' not in args)
+            group = res['Response']
+            embed = discord.Embed(
+                colour=constants.BLUE,
+                title=group['detail']['motto'],
+                description=group['detail']['about']
+            )
+            embed.set_author(
+                name=f"{group['detail']['name']} [{group['detail']['clanInfo']['clanCallsign']}]",
+                url=f"https://www.bungie.net/en/ClanV2?groupid={clan_db.clan_id}"
+            )
+            embed.add_field(
+                name="Members",
+                value=group['detail']['memberCount'],
+                inline=True
+            )
+            embed.add_field(
+                name="Founder",
+                value=group['founder']['bungieNetUserInfo']['displayName'],
+                inline=True
+            )
+            embed.add_field(
+                name="Founded",
+                value=datetime.strptime(
+                    group['detail']['creationDate'],
+                    '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%Y-%m-%d %H:%M:%S %Z'),
+                inline=True
+            )
+            embeds.append(embed)
 
         if len(embeds) > 1:
             paginator = EmbedPages(ctx, embeds)
@@ -653,12 +648,61 @@ Examples:
                     )
             embeds.append(embed)
 
+        imported = [member_id for changes in member_changes.values() for member_id in changes['imported']]
+        if imported:
+            asyncio.create_task(self.report_history_import(ctx, imported))
+
         if len(embeds) > 1:
             paginator = EmbedPages(ctx, embeds)
             await paginator.paginate()
         else:
             return await manager.send_embed(embeds[0])
 
+    async def report_history_import(self, ctx, member_ids):
+        """Keep one message up to date with the progress of new members' game history imports"""
+        manager = MessageManager(ctx, trigger_typing=False)
+        message = None
+        while True:
+            status = await history_backfill.status(self.bot.redis, member_ids)
+            members = status['members']
+            found = f"{status['pages']} history pages read and {status['games']} games found"
+            if status['remaining']:
+                text = (
+                    f"Importing game history for {members} new members, estimated at "
+                    f"{status['estimated_pages']} history requests and up to "
+                    f"{status['estimated_activities']} game reports: "
+                    f"{members - status['remaining']} of {members} members done, {found}"
+                )
+            else:
+                text = f"Imported game history for {members} new members, {found}"
+
+            if message:
+                await message.edit(content=f"{ctx.author.mention}: {text}")
+            else:
+                message = await manager.send_message(text, clean=False)
+
+            if not status['remaining']:
+                break
+            await asyncio.sleep(constants.BACKFILL_REPORT_INTERVAL)
+
+    @clan.command()
+    @clan_is_linked()
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def rescan(self, ctx):
+        """Rescan the full game history of all members (Admin only)"""
+        manager = MessageManager(ctx)
+
+        await manager.send_message(
+            "Rescanning the full game history of all members, this may take a while...",
+            mention=False, clean=False
+        )
+        importing = await history_backfill.pending(self.bot.redis)
+        game_count = await store_all_games(
+            self.bot, ctx.guild.id, count=250, full_rescan=True, skip_member_ids=importing)
+        return await manager.send_message(
+            f"Rescan complete, found {game_count or 0} new games.", mention=False, clean=False)
+
     @clan.command(
         usage=f"<{', '.join(constants.SUPPORTED_GAME_MODES.keys())}>"
     )
@@ -7,6 +7,108 @@ from datetime import datetime
 LOG_FORMAT_MSG = '%(asctime)s %(name)s[%(process)d]: %(levelname)s %(message)s'
 DB_MAX_CONNECTIONS = 20
 
+# Connection pool defaults for outbound HTTP clients, one pool per upstream
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_CONNECTIONS_PER_HOST = 30
+HTTP_KEEPALIVE_TIMEOUT = 30
+HTTP_DNS_CACHE_TTL = 300
+
+# Requests per second allowed against the Bungie API, shared by all processes
+BUNGIE_RATE_LIMIT = 25
+# Per-endpoint requests per second, drawn from the global budget above
+BUNGIE_ENDPOINT_RATE_LIMITS = {
+    'get_activity_history': 10,
+    'get_post_game_carnage_report': 15,
+    'get_profile': 10,
+}
+
+# Maximum concurrent Bungie requests, handed out by priority class. Each
+# process lowers and raises its own limit at runtime based on throttling,
+# errors and average latency, while the shared rate limit stays fixed.
+BUNGIE_MAX_CONCURRENCY = 25
+BUNGIE_LATENCY_TARGET = 5
+BUNGIE_REQUEST_TIMEOUT = 30
+BUNGIE_MAX_TRIES = 5
+BUNGIE_MAX_BACKOFF = 30
+# Error codes for throttled responses, which are retried after ThrottleSeconds
+# (ThrottleLimitExceeded, ThrottleLimitExceededMinutes,
+# ThrottleLimitExceededMomentarily, PerEndpointRequestThrottleExceeded,
+# DestinyThrottledByGameServer)
+BUNGIE_THROTTLE_ERROR_CODES = {31, 35, 36, 51, 1672}
+
+# Endpoint families that each get their own circuit breaker, which opens after
+# a number of consecutive failures and probes again after a timeout
+BUNGIE_ENDPOINT_FAMILIES = {
+    'get_profile': 'profile',
+    'get_activity_history': 'activity history',
+    'get_post_game_carnage_report': 'pgcr',
+    'get_group': 'groups',
+    'get_members_of_group': 'groups',
+    'get_group_pending_members': 'groups',
+    'get_group_invited_members': 'groups',
+    'group_approve_pending_member': 'groups',
+    'group_invite_member': 'groups',
+}
+BUNGIE_BREAKER_THRESHOLD = 5
+BUNGIE_BREAKER_RESET = 30
+PRIORITY_COMMAND = 0
+PRIORITY_LAST_ACTIVE = 1
+PRIORITY_HISTORY = 2
+PRIORITY_NAMES = {
+    PRIORITY_COMMAND: 'command',
+    PRIORITY_LAST_ACTIVE: 'last_active',
+    PRIORITY_HISTORY: 'history',
+}
+
+# Workers per ingestion pipeline stage, and how many items may wait between
+# two stages before the earlier one has to wait. Persisting is kept well below
+# the database connection pool size.
+INGEST_QUEUE_SIZE = 50
+INGEST_WORKERS = {
+    'last-active': 10,
+    'history': 10,
+    'filter': 4,
+    'pgcr': 20,
+    'persist': 2,
+}
+INGEST_PERSIST_BATCH_SIZE = 20
+
+# Queued ingestion jobs are hidden from other workers for the visibility
+# timeout (renewed while they run), and dropped after a number of failures.
+# Failed jobs are retried after a delay that doubles with every attempt, and
+# jobs interrupted by Bungie outages are put back after a short delay.
+JOB_VISIBILITY_TIMEOUT = 300
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 60
+JOB_RELEASE_DELAY = 30
+JOB_WORKER_CONCURRENCY = 4
+JOB_POLL_INTERVAL = 1
+
+# New members' whole histories are imported a few members at a time, one page
+# at a time. Progress is kept in Redis so an import can carry on after a
+# restart, and is reported to the admin who ran the sync.
+BACKFILL_CONCURRENCY = 2
+BACKFILL_PAGE_SIZE = 250
+BACKFILL_MAX_ATTEMPTS = 5
+BACKFILL_PROGRESS_TTL = 7 * 24 * 3600
+BACKFILL_REPORT_INTERVAL = 60
+
+# Default memory limit for cached post-game carnage reports, and how many
+# rejected game instances to remember
+PGCR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PGCR_REJECTED_MAX = 100000
+
+# Local copy of the Destiny manifest content database. Bungie is asked for the
+# manifest version at most once per check interval, the database is read
+# through SQLite's memory-mapped I/O and decoded definitions are kept in a
+# least recently used cache.
+MANIFEST_PATH = 'manifest'
+MANIFEST_CHECK_INTERVAL = 3600
+MANIFEST_DOWNLOAD_TIMEOUT = 300
+MANIFEST_MMAP_SIZE = 256 * 1024 * 1024
+MANIFEST_CACHE_SIZE = 2000
+MANIFEST_QUERY_BATCH_SIZE = 500
+
 BLUE = discord.Color(3381759)
 CLEANUP_DELAY = 4
 
@@ -96,6 +198,19 @@ CLAN_MEMBER_FOUNDER = 5
 
 COMPONENT_CHARACTERS = 200
 
+# Response caching for slowly changing Bungie endpoints. Responses are fresh for
+# `ttl` seconds, then served for up to `stale` more seconds while they are
+# refreshed in the background.
+BUNGIE_CACHE_POLICIES = {
+    'get_group': {'ttl': TIME_HOUR_SECONDS, 'stale': TIME_HOUR_SECONDS},
+    'get_membership_data_by_id': {'ttl': TIME_HOUR_SECONDS, 'stale': 24 * TIME_HOUR_SECONDS},
+    'search_destiny_player': {'ttl': TIME_HOUR_SECONDS, 'stale': TIME_HOUR_SECONDS},
+}
+
+# Profile snapshots are shared by the last active (every 5 minutes) and game
+# history (hourly) jobs, so keep them for just under one last active cycle
+PROFILE_SNAPSHOT_TTL = 4 * TIME_MIN_SECONDS
+
 MODE_NONE = 0
 MODE_STORY = 2
 MODE_STRIKE = 3
@@ -237,6 +352,25 @@ SUPPORTED_GAME_MODES = {
     'raid': [MODE_RAID]
 }
 
+# Activity history mode filters that between them cover every supported mode,
+# with the supported modes each one returns. Bungie matches a filter against
+# an activity's whole list of modes, so a parent mode returns all its children.
+HISTORY_MODE_FILTERS = {
+    MODE_ALLPVP: MODES_PVP,
+    MODE_ALLPVECOMPETITIVE: MODES_GAMBIT,
+    MODE_ALLSTRIKES: [MODE_STRIKE, MODE_NIGHTFALL, MODE_SCOREDNIGHTFALL],
+    MODE_RAID: [MODE_RAID],
+    MODE_MENAGERIE: [MODE_MENAGERIE],
+    MODE_VEXOFFENSIVE: [MODE_VEXOFFENSIVE],
+    MODE_BLACKARMORYRUN: [MODE_BLACKARMORYRUN],
+    MODE_NIGHTMAREHUNT: [MODE_NIGHTMAREHUNT],
+    MODE_HEROICADVENTURE: [MODE_HEROICADVENTURE],
+    MODE_THESUNDIAL: [MODE_THESUNDIAL],
+}
+# Unfiltered pages of a character's history to read before switching to the
+# mode filters above, which cost a request per filter but skip untracked modes
+HISTORY_FILTER_AFTER_PAGES = 4
+
 BUNGIE_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
 FORSAKEN_RELEASE = datetime.strptime('2018-09-04T18:00:00Z', BUNGIE_DATE_FORMAT).astimezone(tz=pytz.utc)
 SHADOWKEEP_RELEASE = datetime.strptime('2019-10-01T18:00:00Z', BUNGIE_DATE_FORMAT).astimezone(tz=pytz.utc)
@@ -7,9 +7,10 @@ from datetime import datetime, timedelta
 from peewee import (
     Model, CharField, BigIntegerField, IntegerField, FloatField,
     ForeignKeyField, Proxy, BooleanField, Check, SQL, fn, Case,
-    InterfaceError, OperationalError, JOIN)
+    InterfaceError, OperationalError, JOIN, EXCLUDED)
 from peewee_async import Manager
 from peewee_asyncext import PooledPostgresqlExtDatabase
+from playhouse.migrate import PostgresqlMigrator, migrate
 from playhouse.postgres_ext import DateTimeTZField
 from seraphsix import constants
 from tenacity import AsyncRetrying, RetryError, wait_exponential, before_sleep_log
@@ -113,6 +114,7 @@ class ClanMember(BaseModel):
     join_date = DateTimeTZField()
     is_active = BooleanField(default=True)
     last_active = DateTimeTZField(null=True)
+    last_scanned = DateTimeTZField(null=True)
     is_sherpa = BooleanField(default=False)
     member_type = IntegerField(
         null=True,
@@ -158,6 +160,13 @@ class GameMember(BaseModel):
         )
 
 
+class CharacterCursor(BaseModel):
+    member = ForeignKeyField(Member)
+    character_id = BigIntegerField(unique=True)
+    instance_id = BigIntegerField()
+    date = DateTimeTZField()
+
+
 class TwitterChannel(BaseModel):
     channel_id = BigIntegerField()
     twitter_id = BigIntegerField()
@@ -214,9 +223,18 @@ class Database(object):
         Game.create_table(True)
         ClanGame.create_table(True)
         GameMember.create_table(True)
+        CharacterCursor.create_table(True)
         TwitterChannel.create_table(True)
         Role.create_table(True)
 
+        # Existing members count as scanned up to their last activity, their
+        # cursors catch anything a scan hadn't picked up yet the next time they play
+        column_names = [column.name for column in self._database.get_columns('clanmember')]
+        if 'last_scanned' not in column_names:
+            migrator = PostgresqlMigrator(self._database)
+            migrate(migrator.add_column('clanmember', 'last_scanned', ClanMember.last_scanned))
+            ClanMember.update(last_scanned=ClanMember.last_active).execute()
+
     @reconnect
     async def create(self, model, **data):
         return await self._objects.create(model, **data)
@@ -394,5 +412,95 @@ class Database(object):
         )
         return await self.execute(query)
 
+    async def get_clan_members_unscanned(self, clan_id):
+        """Get the members of a clan who have been active since their history was last scanned"""
+        query = Member.select(Member, ClanMember).join(ClanMember).join(Clan).where(
+            Clan.id == clan_id,
+            ClanMember.last_active.is_null(False),
+            ClanMember.last_scanned.is_null() | (ClanMember.last_active > ClanMember.last_scanned)
+        )
+        return await self.execute(query)
+
+    async def set_last_scanned(self, clanmember_ids, date):
+        if not clanmember_ids:
+            return
+        query = ClanMember.update(last_scanned=date).where(ClanMember.id << list(clanmember_ids))
+        return await self.execute(query)
+
+    async def get_existing_instance_ids(self, instance_ids):
+        instance_ids = set(instance_ids)
+        if not instance_ids:
+            return set()
+        query = Game.select(Game.instance_id).where(Game.instance_id << list(instance_ids)).tuples()
+        return {instance_id for instance_id, in await self.execute(query)}
+
+    @reconnect
+    async def store_games(self, clan_id, clan_games):
+        """Write a batch of clan games and their clan players in one transaction
+
+        Returns the games that were newly created. Games that already exist are
+        skipped entirely, so a game stored by several members at once only has its
+        players written by whichever of them created it.
+        """
+        if not clan_games:
+            return []
+
+        clan_games = {clan_game.instance_id: clan_game for clan_game in clan_games}
+        game_query = Game.insert_many([
+            dict(mode_id=clan_game.mode_id, instance_id=clan_game.instance_id,
+                 date=clan_game.date, reference_id=clan_game.reference_id)
+            for clan_game in clan_games.values()
+        ]).on_conflict_ignore().returning(Game.id, Game.instance_id)
+
+        async with self._objects.atomic():
+            # peewee-async only reads the first RETURNING row of an insert, so
+            # run it as a raw query to get back every created game
+            sql, params = game_query.sql()
+            game_dbs = list(await self.execute(Game.raw(sql, *params)))
+            if not game_dbs:
+                return []
+
+            await self.execute(ClanGame.insert_many([
+                dict(clan=clan_id, game=game_db.id) for game_db in game_dbs
+            ]).on_conflict_ignore())
+
+            # A player that dropped and re-joined appears more than once in a
+            # game, so fold those entries together before the upsert
+            game_members = {}
+            for game_db in game_dbs:
+                for player in clan_games[game_db.instance_id].clan_players:
+                    key = (player.member_db_id, game_db.id)
+                    if key in game_members:
+                        game_members[key]['time_played'] += player.time_played
+                        game_members[key]['completed'] = player.completed
+                    else:
+                        game_members[key] = dict(
+                            member=player.member_db_id, game=game_db.id,
+                            time_played=player.time_played, completed=player.completed)
+
+            if game_members:
+                await self.execute(GameMember.insert_many(list(game_members.values())).on_conflict(
+                    conflict_target=[GameMember.member, GameMember.game],
+                    update={
+                        GameMember.time_played: GameMember.time_played + EXCLUDED.time_played,
+                        GameMember.completed: EXCLUDED.completed
+                    }
+                ))
+
+        return [clan_games[game_db.instance_id] for game_db in game_dbs]
+
+    async def get_character_cursors(self, member_db):
+        query = CharacterCursor.select().where(CharacterCursor.member == member_db.id)
+        return {cursor.character_id: cursor for cursor in await self.execute(query)}
+
+    async def set_character_cursor(self, member_db, character_id, instance_id, date):
+        query = CharacterCursor.insert(
+            member=member_db.id, character_id=character_id, instance_id=instance_id, date=date
+        ).on_conflict(
+            conflict_target=[CharacterCursor.character_id],
+            update={CharacterCursor.instance_id: instance_id, CharacterCursor.date: date}
+        )
+        return await self.execute(query)
+
     async def close(self):
         await self._objects.close()
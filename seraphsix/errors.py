@@ -47,3 +47,9 @@ class MaintenanceError(CommandError):
     def __init__(self, *args):
         message = "Bungie systems are currently undergoing maintenance, please try again later"
         super().__init__(message, *args)
+
+
+class CircuitOpenError(CommandError):
+    def __init__(self, family, *args):
+        message = f"Bungie {family} services are currently failing, please try again later"
+        super().__init__(message, *args)
@@ -0,0 +1,50 @@
+import logging
+
+from collections import defaultdict
+
+log = logging.getLogger(__name__)
+
+
+class Metrics(object):
+    """In-process counters, gauges and timing observations"""
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.observations = defaultdict(lambda: {'count': 0, 'sum': 0.0, 'max': 0.0})
+
+    def incr(self, name, value=1):
+        self.counters[name] += value
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, value):
+        observation = self.observations[name]
+        observation['count'] += 1
+        observation['sum'] += value
+        observation['max'] = max(observation['max'], value)
+
+    def snapshot(self, prefix=''):
+        data = {}
+        for name, value in self.counters.items():
+            if name.startswith(prefix):
+                data[name] = value
+        for name, value in self.gauges.items():
+            if name.startswith(prefix):
+                data[name] = value
+        for name, observation in self.observations.items():
+            if name.startswith(prefix):
+                data[f"{name}.count"] = observation['count']
+                data[f"{name}.avg"] = observation['sum'] / observation['count']
+                data[f"{name}.max"] = observation['max']
+        return data
+
+    def log(self, prefix=''):
+        for name, value in sorted(self.snapshot(prefix).items()):
+            if isinstance(value, float):
+                value = f"{value:0.3f}"
+            log.info(f"{name}: {value}")
+
+
+metrics = Metrics()
@@ -1,3 +1,5 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
 from datetime import datetime
 from seraphsix import constants
 from seraphsix.cogs.utils.helpers import bungie_date_as_utc
@@ -111,10 +113,48 @@ class Member(User):
         return f"{self.platform_id}-{self.member_id}"
 
 
+def reduce_pgcr(details):
+    """Strip a post-game carnage report down to the fields used by Game, ClanGame and Player"""
+    entries = []
+    for entry in details['entries']:
+        user_info = entry['player']['destinyUserInfo']
+        entries.append({
+            'player': {
+                'destinyUserInfo': {
+                    key: user_info[key] for key in ['membershipId', 'membershipType', 'displayName']
+                    if key in user_info
+                }
+            },
+            'values': {
+                key: {'basic': entry['values'][key]['basic']} for key in ['completed', 'timePlayedSeconds']
+                if key in entry['values']
+            }
+        })
+
+    return {
+        'period': details['period'],
+        'activityDetails': {
+            key: details['activityDetails'][key] for key in ['mode', 'instanceId', 'referenceId']
+        },
+        'entries': entries
+    }
+
+
+def reduce_activity(details):
+    """Strip an activity history entry down to the fields used by Game"""
+    return {
+        'period': details['period'],
+        'activityDetails': {
+            key: details['activityDetails'][key] for key in ['mode', 'instanceId', 'referenceId']
+        }
+    }
+
+
 class Player(object):
     def __init__(self, details):
         self.membership_id = details['player']['destinyUserInfo']['membershipId']
         self.membership_type = details['player']['destinyUserInfo']['membershipType']
+        self.member_db_id = None
 
         self.completed = False
         if details['values']['completed']['basic']['displayValue'] == 'Yes':
@@ -151,33 +191,59 @@ class Game(object):
         return f"<{type(self).__name__}: {self.instance_id}>"
 
 
+@dataclass(frozen=True)
+class IndexedMember:
+    member: object
+    clan_member: object
+    join_date: datetime
+
+
+class MemberIndex(Mapping):
+    """Read-only lookup of clan members by (membership type, membership id)
+
+    Built once per ingestion cycle so matching PGCR players costs a dict lookup
+    each instead of a scan of every member or a database query.
+    """
+
+    def __init__(self, member_dbs):
+        index = {}
+        clan_ids = set()
+        for member_db in member_dbs:
+            clan_ids.add(member_db.clanmember.clan_id)
+            entry = IndexedMember(member_db, member_db.clanmember, member_db.clanmember.join_date)
+            for platform_name, platform_id in constants.PLATFORM_MAP.items():
+                if platform_id == constants.PLATFORM_BUNGIE:
+                    continue
+                membership_id = getattr(member_db, f'{platform_name}_id')
+                if membership_id:
+                    index[(platform_id, int(membership_id))] = entry
+        self._index = index
+        # Identifies the set of clans the index covers
+        self.scope = '-'.join(str(clan_id) for clan_id in sorted(clan_ids))
+
+    def __getitem__(self, key):
+        return self._index[key]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f"<{type(self).__name__}: {len(self)} memberships>"
+
+
 class ClanGame(Game):
-    def __init__(self, details, member_dbs):
+    def __init__(self, details, member_index):
         super().__init__(details)
         self.set_players(details)
 
-        members = {}
-        for member_db in member_dbs:
-            if member_db.psn_id:
-                members.update(
-                    {f'{constants.PLATFORM_PSN}-{member_db.psn_id}': member_db})
-            if member_db.xbox_id:
-                members.update(
-                    {f'{constants.PLATFORM_XBOX}-{member_db.xbox_id}': member_db})
-            if member_db.blizzard_id:
-                members.update(
-                    {f'{constants.PLATFORM_BLIZZARD}-{member_db.blizzard_id}': member_db})
-            if member_db.steam_id:
-                members.update(
-                    {f'{constants.PLATFORM_STEAM}-{member_db.steam_id}': member_db})
-            if member_db.stadia_id:
-                members.update(
-                    {f'{constants.PLATFORM_STADIA}-{member_db.stadia_id}': member_db})
-
         # Loop through all players to find clan members in the game session.
         # Also check if the member joined before the game time.
         self.clan_players = []
         for player in self.players:
-            player_hash = f"{player.membership_type}-{player.membership_id}"
-            if player_hash in members.keys() and self.date > members[player_hash].clanmember.join_date:
+            indexed = member_index.get((player.membership_type, int(player.membership_id)))
+            if indexed and self.date > indexed.join_date:
+                player.member_db_id = indexed.member.id
                 self.clan_players.append(player)
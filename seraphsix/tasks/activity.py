@@ -1,18 +1,49 @@
 import asyncio
-import backoff
+import functools
+import heapq
+import inspect
 import logging
 import pydest
+import pytz
+import random
 
-from peewee import DoesNotExist, fn, IntegrityError
+from datetime import datetime
+from peewee import DoesNotExist, fn
 from seraphsix import constants
 from seraphsix.cogs.utils.helpers import bungie_date_as_utc
-from seraphsix.database import ClanGame as ClanGameDb, ClanMember, Game, GameMember, Guild, Member
-from seraphsix.errors import MaintenanceError
-from seraphsix.models.destiny import Game as GameApi, ClanGame
-from ratelimit import limits, RateLimitException
+from seraphsix.database import ClanMember, Game, GameMember, Guild, Member
+from seraphsix.errors import CircuitOpenError, MaintenanceError
+from seraphsix.metrics import metrics
+from seraphsix.models.destiny import Game as GameApi, ClanGame, MemberIndex, reduce_activity, reduce_pgcr
+from seraphsix.tasks.breaker import CircuitBreakers
+from seraphsix.tasks.cache import ProfileSnapshots, ResponseCache
+from seraphsix.tasks.concurrency import AdaptiveLimit
+from seraphsix.tasks.limiter import RedisTokenBucket
+from seraphsix.tasks.maintenance import MaintenanceGate
+from seraphsix.tasks.manifest import ManifestStore
+from seraphsix.tasks.pipeline import Pipeline, Stage
+from seraphsix.tasks.scheduler import PriorityScheduler
+from seraphsix.tasks.singleflight import SingleFlight
 
 log = logging.getLogger(__name__)
 
+bungie_limiter = RedisTokenBucket(
+    'bungie-ratelimit', constants.BUNGIE_RATE_LIMIT, constants.BUNGIE_ENDPOINT_RATE_LIMITS)
+bungie_maintenance = MaintenanceGate()
+bungie_requests = SingleFlight('bungie-requests')
+bungie_cache = ResponseCache(constants.BUNGIE_CACHE_POLICIES)
+profile_snapshots = ProfileSnapshots()
+destiny_manifest = ManifestStore()
+bungie_scheduler = PriorityScheduler(
+    'bungie-scheduler', constants.BUNGIE_MAX_CONCURRENCY, constants.PRIORITY_NAMES)
+bungie_concurrency = AdaptiveLimit(
+    'bungie-concurrency', constants.BUNGIE_MAX_CONCURRENCY, 1, constants.BUNGIE_MAX_CONCURRENCY,
+    constants.BUNGIE_LATENCY_TARGET)
+bungie_breakers = CircuitBreakers(
+    constants.BUNGIE_ENDPOINT_FAMILIES, constants.BUNGIE_BREAKER_THRESHOLD, constants.BUNGIE_BREAKER_RESET)
+
+supported_modes = set(sum(constants.SUPPORTED_GAME_MODES.values(), []))
+
 
 def parse_platform(member_db, platform_id):
     if platform_id == constants.PLATFORM_BUNGIE:
@@ -36,88 +67,284 @@ def parse_platform(member_db, platform_id):
     return member_id, member_username
 
 
-def backoff_hdlr(details):
-    if details['wait'] > 30 or details['tries'] > 10:
-        log.info(
-            f"Backing off {details['wait']:0.1f} seconds after {details['tries']} tries "
-            f"for {details['args'][3]}-{details['args'][2]}"
-        )
+def pydest_call(function):
+    """Return the endpoint name, arguments and a factory for new copies of an un-awaited Pydest coroutine"""
+    arguments = dict(inspect.getcoroutinelocals(function))
+    owner = arguments.pop('self', None)
+    factory = None
+    if owner is not None:
+        factory = functools.partial(getattr(owner, function.__name__), **arguments)
+    return function.__name__, arguments, factory
+
+
+def set_bungie_limits(controller):
+    # The rate limiter's buckets are shared with every other process, so only
+    # this process's concurrency follows its own controller
+    bungie_scheduler.set_limit(max(1, int(controller.limit)))
+
+
+bungie_concurrency.add_listener(set_bungie_limits)
+
+
+async def request_pydest(function, factory, redis, member_id=None, caller=None, cache_key=None,
+                         cache_policy=None, priority=constants.PRIORITY_COMMAND):
+    loop = asyncio.get_event_loop()
+    breaker = bungie_breakers.get(function.__name__)
+    attempt = 0
+    while True:
+        retry_after = 0
+        if attempt and breaker and not breaker.allow():
+            function.close()
+            raise CircuitOpenError(breaker.name)
+
+        await bungie_concurrency.wait()
+        async with bungie_scheduler.slot(priority):
+            waited = await bungie_limiter.acquire(redis, function.__name__)
+            if waited > 30:
+                log.info(f"Waited {waited:0.1f} seconds for the Bungie rate limit for {caller} {member_id}")
+
+            started = loop.time()
+            try:
+                data = await asyncio.wait_for(function, constants.BUNGIE_REQUEST_TIMEOUT)
+            except pydest.pydest.PydestMaintenanceException as e:
+                await bungie_maintenance.enable(redis)
+                log.error(e)
+                raise MaintenanceError
+            except (pydest.pydest.PydestPrivateHistoryException, pydest.pydest.PydestTokenException):
+                if breaker:
+                    breaker.on_success()
+                raise
+            except (pydest.pydest.PydestException, asyncio.TimeoutError) as e:
+                bungie_concurrency.on_failure(f"{type(e).__name__} from {function.__name__}")
+                if breaker:
+                    breaker.on_failure()
+                attempt += 1
+                if not factory or attempt >= constants.BUNGIE_MAX_TRIES:
+                    raise
+                log.debug(f"Retrying {function.__name__} for {caller} {member_id} after {type(e).__name__}: {e}")
+            else:
+                throttle_seconds = data.get('ThrottleSeconds', 0) if data else 0
+                bungie_concurrency.on_success(loop.time() - started, throttle_seconds)
+                error_code = data.get('ErrorCode', 1) if data else 1
+                throttled = error_code != 1 and (
+                    throttle_seconds or error_code in constants.BUNGIE_THROTTLE_ERROR_CODES)
+                if not throttled:
+                    if breaker:
+                        breaker.on_success()
+                    break
+
+                # A throttled response has no data, so it must not be taken for an empty result
+                attempt += 1
+                if not factory or attempt >= constants.BUNGIE_MAX_TRIES:
+                    raise pydest.pydest.PydestException(
+                        f"{function.__name__} was still throttled after {attempt} tries: {data.get('ErrorStatus')}")
+                log.debug(f"Retrying {function.__name__} for {caller} {member_id} in {throttle_seconds} seconds "
+                          f"after {data.get('ErrorStatus')}")
+                retry_after = throttle_seconds
+
+        # Wait out any throttle Bungie asked for, and back off exponentially with
+        # jitter on top of any throttle the controller is enforcing
+        await asyncio.sleep(retry_after + random.uniform(0, min(constants.BUNGIE_MAX_BACKOFF, 2 ** attempt)))
+        function = factory()
+
+    if cache_policy and data and data.get('ErrorCode') == 1:
+        await bungie_cache.set(redis, cache_key, data, cache_policy)
+    return data
+
+
+async def fetch_pydest(key, function, factory, redis, member_id=None, caller=None, cache_policy=None,
+                       priority=constants.PRIORITY_COMMAND):
+    # Identical requests made while one is already in flight share its response
+    if key in bungie_requests:
+        function.close()
+    return await bungie_requests.do(key, functools.partial(
+        request_pydest, function, factory, redis, member_id, caller, key, cache_policy, priority))
+
+
+async def refresh_pydest(key, function, factory, redis, member_id=None, caller=None, cache_policy=None,
+                         priority=constants.PRIORITY_COMMAND):
+    try:
+        await fetch_pydest(key, function, factory, redis, member_id, caller, cache_policy, priority)
+    except Exception:
+        log.exception(f"Could not refresh cached response for {key}")
 
 
-@backoff.on_exception(
-    backoff.expo,
-    (pydest.pydest.PydestPrivateHistoryException, pydest.pydest.PydestMaintenanceException),
-    max_tries=1, logger=None)
-@backoff.on_exception(backoff.expo, pydest.pydest.PydestException, max_tries=100, logger=None)
-@backoff.on_exception(backoff.expo, asyncio.TimeoutError, max_tries=1)
-@backoff.on_exception(backoff.expo, RateLimitException, max_tries=100, logger=None, on_backoff=backoff_hdlr)
-@limits(calls=25, period=1)
-async def execute_pydest(function, redis, member_id=None, caller=None):
-    is_maintenance = await redis.get('global-bungie-maintenance')
-    if is_maintenance and eval(is_maintenance):
-        await function()
+async def execute_pydest(function, redis, member_id=None, caller=None, use_cache=True,
+                         priority=constants.PRIORITY_COMMAND):
+    if bungie_maintenance.active:
+        function.close()
         raise MaintenanceError
-    try:
-        return await asyncio.create_task(function)
-    except pydest.pydest.PydestMaintenanceException as e:
-        await redis.set('global-bungie-maintenance', str(True), expire=constants.TIME_MIN_SECONDS)
-        log.error(e)
-        raise MaintenanceError
-    except RuntimeError as e:
-        log.error(f"{member_id} {caller} {e}")
-        return None
-
 
-async def get_activity_history(destiny, redis, platform_id, member_id, char_id, count):
-    page = 0
+    endpoint, arguments, factory = pydest_call(function)
+    key = f"{endpoint}:{sorted(arguments.items())}"
+
+    # Cached responses are still served while the endpoint's breaker is open
+    breaker = bungie_breakers.get(endpoint)
+    cache_policy = bungie_cache.policy(endpoint)
+    if cache_policy and use_cache:
+        data, fresh = await bungie_cache.get(redis, key, cache_policy)
+        if data and fresh:
+            function.close()
+            return data
+        elif data:
+            # Serve the stale response now and revalidate it in the background
+            if breaker and key not in bungie_requests and not breaker.allow():
+                function.close()
+            else:
+                asyncio.create_task(refresh_pydest(
+                    key, function, factory, redis, member_id, caller, cache_policy, priority))
+            return data
+
+    if breaker and key not in bungie_requests and not breaker.allow():
+        function.close()
+        raise CircuitOpenError(breaker.name)
+
+    return await fetch_pydest(key, function, factory, redis, member_id, caller, cache_policy, priority)
+
+
+def is_known_activity(activity, cursor):
+    if int(activity['activityDetails']['instanceId']) == cursor.instance_id:
+        return True
+    return bungie_date_as_utc(activity['period']) <= cursor.date
+
+
+async def get_activity_history(destiny, redis, platform_id, member_id, char_id, count, cursor=None,
+                               mode=constants.MODE_NONE, max_pages=None, first_page=0):
+    """Get a character's activities in supported modes, newest first, and whether that's all of them"""
+    page = first_page
     activities = []
 
-    function = destiny.api.get_activity_history(platform_id, member_id, char_id, count=count, page=page, mode=0)
-    data = await execute_pydest(function, redis, member_id, 'get_activity_history')
+    function = destiny.api.get_activity_history(platform_id, member_id, char_id, count=count, page=page, mode=mode)
+    data = await execute_pydest(
+        function, redis, member_id, 'get_activity_history', priority=constants.PRIORITY_HISTORY)
     response = data['Response']
 
     while 'activities' in response:
         page += 1
-        if activities:
-            activities.extend(response['activities'])
-        else:
-            activities = response['activities']
-        function = destiny.api.get_activity_history(platform_id, member_id, char_id, count=count, page=page, mode=0)
-        data = await execute_pydest(function, redis, member_id, 'get_activity_history')
+        for activity in response['activities']:
+            if cursor and is_known_activity(activity, cursor):
+                metrics.incr('activity-history.pages_saved')
+                return activities, True
+            if activity['activityDetails']['mode'] not in supported_modes:
+                continue
+            # Only keep the fields that are read later so the full pages can be freed
+            activities.append(reduce_activity(activity))
+        # A short page is the last one, so there's no need to ask for the empty page after it
+        if len(response['activities']) < count:
+            break
+        if max_pages and page - first_page >= max_pages:
+            return activities, False
+        function = destiny.api.get_activity_history(platform_id, member_id, char_id, count=count, page=page, mode=mode)
+        data = await execute_pydest(
+            function, redis, member_id, 'get_activity_history', priority=constants.PRIORITY_HISTORY)
         response = data['Response']
 
-    return activities
+    return activities, True
 
 
-async def get_pgcr(destiny, redis, activity_id):
+async def get_pgcr(destiny, redis, activity_id, cache=None):
+    if cache:
+        pgcr = await cache.get(redis, activity_id)
+        if pgcr:
+            return pgcr
+
     function = destiny.api.get_post_game_carnage_report(activity_id)
-    data = await execute_pydest(function, redis, activity_id, 'get_pgcr')
+    data = await execute_pydest(function, redis, activity_id, 'get_pgcr', priority=constants.PRIORITY_HISTORY)
     pgcr = data['Response']
-    return pgcr
+    if not pgcr:
+        return pgcr
+
+    if cache:
+        return await cache.set(redis, activity_id, pgcr)
+    return reduce_pgcr(pgcr)
 
 
-async def get_characters(destiny, redis, member_id, platform_id, caller=None):
+async def get_profile_snapshot(destiny, redis, member_id, platform_id, caller=None,
+                               priority=constants.PRIORITY_HISTORY):
+    snapshot = await profile_snapshots.get(redis, platform_id, member_id)
+    if snapshot:
+        return snapshot
+
     function = destiny.api.get_profile(platform_id, member_id, [constants.COMPONENT_CHARACTERS])
-    data = await execute_pydest(function, redis, member_id, caller)
+    data = await execute_pydest(function, redis, member_id, caller, priority=priority)
     characters = data['Response']['characters']['data']
-    return characters
+    return await profile_snapshots.set(redis, platform_id, member_id, characters)
+
+
+async def update_manifest(destiny, redis):
+    async def get_manifest():
+        data = await execute_pydest(destiny.api.get_destiny_manifest(), redis, caller='update_manifest')
+        return data['Response']
+    await destiny_manifest.update(destiny.api.session, get_manifest)
+
+
+async def decode_activities(destiny, redis, reference_ids):
+    """Get activity definitions mapped by reference id, from the local manifest copy"""
+    await update_manifest(destiny, redis)
+    return destiny_manifest.decode_many(reference_ids, 'DestinyActivityDefinition')
 
 
 async def decode_activity(destiny, redis, reference_id):
-    await execute_pydest(destiny.update_manifest(), reference_id, 'decode_activity')
-    function = destiny.decode_hash(reference_id, 'DestinyActivityDefinition')
-    return await execute_pydest(function, redis, reference_id, 'decode_activity')
+    definitions = await decode_activities(destiny, redis, [reference_id])
+    return definitions.get(int(reference_id))
+
+
+async def get_character_activities(destiny, redis, platform_id, member_id, char_id, count, cursor=None):
+    """Get a character's activities in supported modes, newest first"""
+    # New activities since a cursor usually fit in one unfiltered page. A long
+    # history downloads far less one supported mode family at a time, even
+    # though that takes at least a request per family.
+    first_activities, complete = await get_activity_history(
+        destiny, redis, platform_id, member_id, char_id, count=count, cursor=cursor,
+        max_pages=None if cursor else constants.HISTORY_FILTER_AFTER_PAGES)
+    activities = {activity['activityDetails']['instanceId']: activity for activity in first_activities}
+    if not complete:
+        metrics.incr('activity-history.filtered_walks')
+        results = await asyncio.gather(*[
+            get_activity_history(destiny, redis, platform_id, member_id, char_id, count=count, mode=mode)
+            for mode in constants.HISTORY_MODE_FILTERS.keys()
+        ])
+        for mode_activities, _ in results:
+            for activity in mode_activities:
+                activities[activity['activityDetails']['instanceId']] = activity
+    for activity in activities.values():
+        activity['characterId'] = int(char_id)
+    return sorted(activities.values(), key=lambda activity: activity['period'], reverse=True)
+
+
+async def get_activity_list(destiny, redis, platform_id, member_id, char_ids, count, cursors=None):
+    """Get every character's activities merged into one list, newest first and without repeats"""
+    cursors = cursors or {}
+    character_activities = await asyncio.gather(*[
+        get_character_activities(
+            destiny, redis, platform_id, member_id, char_id, count, cursors.get(int(char_id)))
+        for char_id in char_ids
+    ])
 
+    activities = []
+    instance_ids = set()
+    merged = heapq.merge(*character_activities, key=lambda activity: activity['period'], reverse=True)
+    for activity in merged:
+        instance_id = activity['activityDetails']['instanceId']
+        if instance_id not in instance_ids:
+            instance_ids.add(instance_id)
+            activities.append(activity)
+    return activities
 
-async def get_activity_list(destiny, redis, platform_id, member_id, char_ids, count):
-    all_activity_ids = []
-    for char_id in char_ids:
-        activities = await get_activity_history(
-            destiny, redis, platform_id, member_id, char_id, count=count)
-        if not activities:
+
+async def store_character_cursors(database, member_db, activities, skipped_char_ids):
+    """Move each character's cursor to the newest of its processed activities"""
+    newest = {}
+    for activity in activities:
+        char_id = activity['characterId']
+        if char_id in skipped_char_ids:
             continue
-        all_activity_ids.extend([activity for activity in activities])
-    return all_activity_ids
+        date = bungie_date_as_utc(activity['period'])
+        if char_id not in newest or date > newest[char_id][1]:
+            newest[char_id] = (int(activity['activityDetails']['instanceId']), date)
+
+    for char_id, (instance_id, date) in newest.items():
+        await database.set_character_cursor(member_db, char_id, instance_id, date)
 
 
 async def get_last_active(destiny, redis, member_db):
@@ -126,14 +353,15 @@ async def get_last_active(destiny, redis, member_db):
 
     acct_last_active = None
     try:
-        characters = await get_characters(destiny, redis, member_id, platform_id, 'get_last_active')
-        characters = characters.items()
-    except AttributeError:
+        snapshot = await get_profile_snapshot(
+            destiny, redis, member_id, platform_id, 'get_last_active', constants.PRIORITY_LAST_ACTIVE)
+        characters = snapshot['characters'].values()
+    except (AttributeError, KeyError, TypeError):
         log.error(f"Could not get character data for {platform_id}-{member_id}")
         return acct_last_active
 
-    for _, character in characters:
-        char_last_active = bungie_date_as_utc(character['dateLastPlayed'])
+    for date_last_played in characters:
+        char_last_active = bungie_date_as_utc(date_last_played)
         if not acct_last_active or char_last_active > acct_last_active:
             acct_last_active = char_last_active
             log.debug(f"Found last active date for {platform_id}-{member_id}: {acct_last_active}")
@@ -141,11 +369,25 @@ async def get_last_active(destiny, redis, member_db):
 
 
 async def store_last_active(bot, member_db):
-    last_active = await get_last_active(bot.destiny, bot.redis, member_db)
+    try:
+        last_active = await get_last_active(bot.destiny, bot.redis, member_db)
+    except CircuitOpenError as e:
+        log.debug(f"Skipping last active date for {member_db.clanmember.platform_id}: {e}")
+        return
+    except (pydest.pydest.PydestException, asyncio.TimeoutError) as e:
+        log.info(f"Skipping last active date for member {member_db.id}: {e!r}")
+        return
     member_db.clanmember.last_active = last_active
     await bot.database.update(member_db.clanmember)
 
 
+async def store_all_last_active(bot, member_dbs):
+    pipeline = Pipeline('last-active', [
+        Stage('profile', functools.partial(store_last_active, bot), constants.INGEST_WORKERS['last-active']),
+    ], constants.INGEST_QUEUE_SIZE)
+    await pipeline.run(member_dbs)
+
+
 async def get_game_counts(database, game_mode, member_db=None):
     counts = {}
     base_query = Game.select()
@@ -218,110 +460,202 @@ async def get_sherpa_time_played(database, member_db):
     return (total_time, unique_sherpas)
 
 
-async def store_game_member(bot, player, game_db, member_db):
-    player_db = await bot.database.get_clan_member_by_platform(
-        player.membership_id, player.membership_type, member_db.clanmember.clan_id)
-
-    try:
-        # Create the game member
-        await bot.database.create(
-            GameMember, member=player_db.id, game=game_db.id,
-            completed=player.completed, time_played=player.time_played)
-    except IntegrityError:
-        # If one already exists, we can assume this is due to a drop/re-join event so
-        # increment the time played and set the completion flag
-        game_member_db = await bot.database.get(GameMember, game=game_db.id, member=player_db.id)
-        game_member_db.time_played += player.time_played
-
-        if not game_member_db.completed or game_member_db.completed != player.completed:
-            game_member_db.completed = player.completed
-        await bot.database.update(game_member_db)
-
-    log.debug(f"Player {player.membership_id} created in game id {game_db.instance_id}")
-
-
-async def store_member_history(member_dbs, bot, member_db, count):
+async def scan_member_history(bot, member_db, count, full_rescan=False):
+    """Get a member's activities newer than their cursors and the date they are complete after, or None"""
     platform_id = member_db.clanmember.platform_id
-    member_id, member_username = parse_platform(member_db, platform_id)
+    member_id, _ = parse_platform(member_db, platform_id)
+
+    # A full rescan ignores the cursors and walks every character's whole history
+    cursors = None
+    if not full_rescan:
+        cursors = await bot.database.get_character_cursors(member_db)
 
     try:
-        characters = await get_characters(bot.destiny, bot.redis, member_id, platform_id, 'store_member_history')
-        char_ids = characters.keys()
+        snapshot = await get_profile_snapshot(bot.destiny, bot.redis, member_id, platform_id, 'store_member_history')
+        char_ids = snapshot['characters'].keys()
+        activities = await get_activity_list(
+            bot.destiny, bot.redis, platform_id, member_id, char_ids, count, cursors
+        )
     except (KeyError, TypeError):
         log.error(f"Could not get character data for {platform_id}-{member_id}")
         return
+    except CircuitOpenError as e:
+        log.debug(f"Skipping game history for {platform_id}-{member_id}: {e}")
+        return
+    except (pydest.pydest.PydestException, asyncio.TimeoutError) as e:
+        # Private histories and requests that failed every retry only skip this member
+        log.info(f"Skipping game history for {platform_id}-{member_id}: {e!r}")
+        metrics.incr('activity-history.members_failed')
+        return
 
-    all_activities = await get_activity_list(
-        bot.destiny, bot.redis, platform_id, member_id, char_ids, count
-    )
+    # Every game after the newest cursor was returned, older ones may be hidden by a cursor
+    complete_after = None
+    if cursors:
+        complete_after = max(
+            (cursors[int(char_id)].date for char_id in char_ids if int(char_id) in cursors), default=None)
+    return activities, complete_after
 
-    mode_count = 0
-    for activity in all_activities:
-        game = GameApi(activity)
 
-        try:
-            await bot.database.get(Game, instance_id=game.instance_id)
-        except DoesNotExist:
-            pass
-        else:
-            log.debug(f"Continuing because game {game.instance_id} exists")
-            continue
-
-        # Check if the game occurred before Forsaken released (ie. Season 4), or
-        # if the game occurred before a configured cutoff date, or if the member
-        # joined before game time, or if the game is not a supported one.
-        # If any of those apply, the game is not eligible.
-        supported_modes = set(sum(constants.SUPPORTED_GAME_MODES.values(), []))
-        if (game.date < constants.FORSAKEN_RELEASE or
+def is_eligible_game(bot, member_db, game):
+    # Check if the game occurred before Forsaken released (ie. Season 4), or
+    # if the game occurred before a configured cutoff date, or if the member
+    # joined before game time, or if the game is not a supported one.
+    # If any of those apply, the game is not eligible.
+    return not (game.date < constants.FORSAKEN_RELEASE or
                 game.date < bot.config.activity_cutoff or
                 game.date < member_db.clanmember.join_date or
-                game.mode_id not in supported_modes):
-            log.debug(f"Continuing because game {game.instance_id} isn't eligible")
-            continue
+                game.mode_id not in supported_modes)
 
-        pgcr = await get_pgcr(bot.destiny, bot.redis, game.instance_id)
-        if not pgcr:
-            log.error(f"{member_username}: {pgcr}")
-            log.debug(f"Continuing because error with game {game.instance_id}")
-            continue
 
-        clan_game = ClanGame(pgcr, member_dbs)
+async def get_clan_game(bot, member_index, game):
+    """Fetch and match a game's PGCR, returning None if it has too few clan players"""
+    pgcr = await get_pgcr(bot.destiny, bot.redis, game.instance_id, bot.pgcr_cache)
+    if not pgcr:
+        raise LookupError(f"Could not get PGCR for game {game.instance_id}")
 
-        # Check if player count is below the threshold
-        game_mode_details = constants.MODE_MAP[game.mode_id]
-        if len(clan_game.clan_players) < game_mode_details['threshold']:
-            log.debug(f"Continuing because not enough clan players in game {game.instance_id}")
-            continue
+    clan_game = ClanGame(pgcr, member_index)
 
-        try:
-            game_db = await bot.database.create(Game, **vars(clan_game))
-        except IntegrityError:
-            # Mitigate possible race condition when multiple parallel jobs try to
-            # do the same thing. Likely when there are multiple people in the same
-            # game instance.
-            # TODO: Figure out a better way to 'lock' things
-            continue
+    # Check if player count is below the threshold
+    if len(clan_game.clan_players) < constants.MODE_MAP[game.mode_id]['threshold']:
+        log.debug(f"Continuing because not enough clan players in game {game.instance_id}")
+        await bot.pgcr_cache.reject(bot.redis, game.instance_id, member_index.scope)
+        return
+    return clan_game
 
-        game_title = game_mode_details['title'].title()
-        log.info(f"{game_title} game id {game.instance_id} created")
-        mode_count += 1
 
-        try:
-            await bot.database.get(ClanGameDb, clan=member_db.clanmember.clan_id, game=game_db.id)
-        except DoesNotExist:
-            await bot.database.create(ClanGameDb, clan=member_db.clanmember.clan_id, game=game_db.id)
-            tasks = [
-                store_game_member(bot, player, game_db, member_db)
-                for player in clan_game.clan_players
-            ]
-            await asyncio.gather(*tasks)
+def max_clan_players(game, reporter_ids, members, complete_after):
+    """Get the most clan players a game can have according to the scanned histories"""
+    count = len(reporter_ids)
+    for member_id, entry in members.items():
+        if member_id in reporter_ids or game.date <= entry.join_date:
+            continue
+        if member_id not in complete_after:
+            last_active = entry.clan_member.last_active
+            if not last_active or game.date <= last_active:
+                count += 1
+        elif complete_after[member_id] and game.date <= complete_after[member_id]:
+            count += 1
+    return count
+
+
+async def store_members_history(member_index, bot, member_dbs, count, full_rescan=False):
+    """Store the games found in several members' histories"""
+    async def scan(member_db):
+        scan = await scan_member_history(bot, member_db, count, full_rescan)
+        if scan:
+            return (member_db, *scan)
+
+    # Anything played after this is left for the next scan
+    scanned_at = datetime.now(pytz.utc)
+
+    history_pipeline = Pipeline('ingest', [
+        Stage('history', scan, constants.INGEST_WORKERS['history']),
+    ], constants.INGEST_QUEUE_SIZE)
+    scans = await history_pipeline.run(member_dbs)
+    mode_count, skipped_char_ids = await store_scanned_games(member_index, bot, scans)
+
+    for member_db, activities, _ in scans:
+        await store_character_cursors(bot.database, member_db, activities, skipped_char_ids[member_db.id])
+
+    # Members with games to retry stay due for a scan
+    await bot.database.set_last_scanned(
+        [member_db.clanmember.id for member_db, _, _ in scans if not skipped_char_ids[member_db.id]], scanned_at)
 
     if mode_count:
-        log.debug(f"Found {mode_count} games for {member_username}")
+        log.debug(f"Found {mode_count} games for {len(scans)} members")
         return mode_count
 
 
-async def store_all_games(bot, guild_id, count=30):
+async def store_scanned_games(member_index, bot, scans):
+    """Store the new clan games among scanned activities"""
+    complete_after = {member_db.id: member_complete_after for member_db, _, member_complete_after in scans}
+
+    # Look up every instance in one query rather than one query per activity
+    existing_instance_ids = await bot.database.get_existing_instance_ids(
+        int(activity['activityDetails']['instanceId'])
+        for _, activities, _ in scans for activity in activities
+    )
+
+    # Map each new eligible instance to the members, and their characters, that reported it
+    games = {}
+    reporters = {}
+    for member_db, activities, _ in scans:
+        for activity in activities:
+            game = GameApi(activity)
+            if game.instance_id in existing_instance_ids:
+                continue
+            if not is_eligible_game(bot, member_db, game):
+                log.debug(f"Continuing because game {game.instance_id} isn't eligible")
+                continue
+            games.setdefault(game.instance_id, game)
+            reporters.setdefault(game.instance_id, []).append((member_db, activity['characterId']))
+
+    # Reporters are clan players, so these games are known to pass the threshold before fetching
+    qualified = sum(
+        len(set(member_db.id for member_db, _ in reporters[instance_id])) >=
+        constants.MODE_MAP[game.mode_id]['threshold']
+        for instance_id, game in games.items()
+    )
+    metrics.incr('activity-history.instances', len(games))
+    metrics.incr('activity-history.instances_qualified', qualified)
+    log.debug(
+        f"Found {len(games)} new games for {len(scans)} members, {qualified} known to have enough clan players")
+
+    members = {entry.member.id: entry for entry in member_index.values()}
+    # Characters with games that couldn't be processed keep their cursor so
+    # those games are retried on the next run
+    skipped_char_ids = {member_db.id: set() for member_db, _, _ in scans}
+
+    async def filter_game(game):
+        # Skip fetching games that were already rejected or that the histories show
+        # can't have enough clan players
+        reporter_ids = set(member_db.id for member_db, _ in reporters[game.instance_id])
+        threshold = constants.MODE_MAP[game.mode_id]['threshold']
+        if await bot.pgcr_cache.is_rejected(bot.redis, game.instance_id, member_index.scope):
+            log.debug(f"Continuing because game {game.instance_id} was previously rejected")
+        elif max_clan_players(game, reporter_ids, members, complete_after) < threshold:
+            log.debug(f"Continuing because game {game.instance_id} can't have enough clan players")
+        else:
+            return game
+        metrics.incr('activity-history.pgcrs_skipped')
+
+    async def fetch_game(game):
+        try:
+            return await get_clan_game(bot, member_index, game)
+        except (CircuitOpenError, LookupError, pydest.pydest.PydestException, asyncio.TimeoutError) as e:
+            log.debug(f"Continuing because error with game {game.instance_id}: {e!r}")
+            for member_db, char_id in reporters[game.instance_id]:
+                skipped_char_ids[member_db.id].add(char_id)
+
+    async def persist_games(clan_games):
+        # Each game belongs to the clan of the first member who reported it
+        clan_batches = {}
+        for clan_game in clan_games:
+            member_db, _ = reporters[clan_game.instance_id][0]
+            clan_batches.setdefault(member_db.clanmember.clan_id, []).append(clan_game)
+
+        created_games = []
+        for clan_id, batch in clan_batches.items():
+            created_games.extend(await bot.database.store_games(clan_id, batch))
+        for clan_game in created_games:
+            game_title = constants.MODE_MAP[clan_game.mode_id]['title'].title()
+            log.info(f"{game_title} game id {clan_game.instance_id} created")
+        return len(created_games)
+
+    game_pipeline = Pipeline('ingest', [
+        Stage('filter', filter_game, constants.INGEST_WORKERS['filter']),
+        Stage('pgcr', fetch_game, constants.INGEST_WORKERS['pgcr']),
+        Stage('persist', persist_games, constants.INGEST_WORKERS['persist'], constants.INGEST_PERSIST_BATCH_SIZE),
+    ], constants.INGEST_QUEUE_SIZE)
+    mode_count = sum(await game_pipeline.run(games.values()))
+    return mode_count, skipped_char_ids
+
+
+async def store_member_history(member_index, bot, member_db, count, full_rescan=False):
+    return await store_members_history(member_index, bot, [member_db], count, full_rescan)
+
+
+async def store_all_games(bot, guild_id, count=30, full_rescan=False, skip_member_ids=()):
     guild_db = await bot.database.get(Guild, guild_id=guild_id)
 
     try:
@@ -329,29 +663,39 @@ async def store_all_games(bot, guild_id, count=30):
     except DoesNotExist:
         return
 
-    log.info(f"Finding all games for members of server {guild_id} active in the last hour")
+    if not bungie_breakers.available('profile', 'activity history', 'pgcr'):
+        log.info(f"Skipping games for members of server {guild_id} while Bungie services are failing")
+        return
+
+    members_description = 'all members' if full_rescan else 'members active since their last scan'
+    log.info(f"Finding all games for {members_description} of server {guild_id}")
 
-    tasks = []
-    member_dbs = []
+    # PGCRs are matched against every member of the clan, only the members due
+    # for a scan have their histories read
+    batches = []
     for clan_db in clan_dbs:
         if not clan_db.activity_tracking:
             log.info(f"Clan activity tracking disabled for Clan {clan_db.name}, skipping")
             continue
 
-        active_members = await bot.database.get_clan_members_active(clan_db.id, hours=1)
-        if guild_db.aggregate_clans:
-            member_dbs.extend(active_members)
+        roster = list(await bot.database.get_clan_members([clan_db.clan_id]))
+        if full_rescan:
+            active_members = roster
         else:
-            member_dbs = active_members
-
-        tasks.extend([
-            store_member_history(member_dbs, bot, member_db, count)
-            for member_db in member_dbs
-        ])
-
-    results = await asyncio.gather(*tasks)
-
-    log.info(
-        f"Found {sum(filter(None, results))} games for members "
-        f"of server {guild_id} active in the last hour"
-    )
+            active_members = await bot.database.get_clan_members_unscanned(clan_db.id)
+        # Members whose history is still being imported have no cursors yet, and
+        # scanning them would read their whole history again
+        batches.append((roster, [member_db for member_db in active_members if member_db.id not in skip_member_ids]))
+
+    # Ingest the whole guild as one batch when clans are aggregated, and each
+    # clan on its own otherwise
+    if guild_db.aggregate_clans:
+        batches = [(sum([roster for roster, _ in batches], []), sum([due for _, due in batches], []))]
+
+    # Each batch runs through its own bounded pipelines, so batches are processed in turn
+    game_count = 0
+    for roster, member_dbs in batches:
+        game_count += await store_members_history(MemberIndex(roster), bot, member_dbs, count, full_rescan) or 0
+
+    log.info(f"Found {game_count} games for {members_description} of server {guild_id}")
+    return game_count
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+import pydest
+
+from seraphsix import constants
+from seraphsix.cogs.utils.helpers import bungie_date_as_utc
+from seraphsix.database import Clan, ClanMember, Member
+from seraphsix.errors import CircuitOpenError, MaintenanceError
+from seraphsix.metrics import metrics
+from seraphsix.models.destiny import MemberIndex
+from seraphsix.tasks.activity import (
+    execute_pydest, get_activity_history, get_profile_snapshot, parse_platform, store_scanned_games)
+
+log = logging.getLogger(__name__)
+
+
+async def estimate_history(bot, member_db, count):
+    """Estimate the history pages and PGCRs needed to import a member's whole history"""
+    platform_id = member_db.clanmember.platform_id
+    member_id, _ = parse_platform(member_db, platform_id)
+
+    function = bot.destiny.api.get_historical_stats_for_account(platform_id, member_id)
+    data = await execute_pydest(
+        function, bot.redis, member_id, 'estimate_history', priority=constants.PRIORITY_HISTORY)
+
+    pages = activities = 0
+    for character in data['Response']['characters']:
+        if character.get('deleted'):
+            continue
+        entered = sum(
+            int(results['allTime']['activitiesEntered']['basic']['value'])
+            for results in character['results'].values() if results.get('allTime')
+        )
+        # The last page is always a short one, even if that means it's empty
+        pages += entered // count + 1
+        activities += entered
+    return dict(estimated_pages=pages, estimated_activities=activities)
+
+
+class HistoryBackfill(object):
+    """Import the whole game history of new clan members a few members at a time"""
+
+    def __init__(self, name='history-backfill', concurrency=constants.BACKFILL_CONCURRENCY,
+                 max_attempts=constants.BACKFILL_MAX_ATTEMPTS):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.members_key = f"{name}-members"
+        self._queue = None
+        self._queued = set()
+        self._workers = []
+
+    def _progress_key(self, member_id):
+        return f"{self.name}-progress-{member_id}"
+
+    async def pending(self, redis):
+        """Get the ids of every member whose import hasn't finished"""
+        return {int(member_id) for member_id in await redis.hkeys(self.members_key)}
+
+    async def add(self, bot, member_db, clan_id, count=constants.BACKFILL_PAGE_SIZE):
+        """Queue a member's import and return its estimate"""
+        try:
+            estimate = await estimate_history(bot, member_db, count)
+        except (KeyError, TypeError, CircuitOpenError, MaintenanceError, asyncio.TimeoutError,
+                pydest.pydest.PydestException) as e:
+            # The import is still queued, it just can't be estimated
+            log.info(f"Could not estimate the game history of member {member_db.id}: {e!r}")
+            estimate = dict(estimated_pages=0, estimated_activities=0)
+
+        progress_key = self._progress_key(member_db.id)
+        transaction = bot.redis.multi_exec()
+        transaction.hset(self.members_key, member_db.id, json.dumps(dict(clan_id=clan_id, count=count)))
+        transaction.hmset_dict(progress_key, estimate)
+        transaction.expire(progress_key, constants.BACKFILL_PROGRESS_TTL)
+        await transaction.execute()
+        metrics.incr(f"{self.name}.estimated_pages", estimate['estimated_pages'])
+
+        # Without workers in this process the import is run as a queued job
+        if self._queue is not None:
+            self._put(member_db.id)
+        return estimate
+
+    async def status(self, redis, member_ids):
+        """Add up the estimated and finished work of several members' imports"""
+        status = dict(members=len(member_ids), estimated_pages=0, estimated_activities=0, pages=0, games=0)
+        for member_id in member_ids:
+            progress = await redis.hgetall(self._progress_key(member_id), encoding='utf-8')
+            for field in ['estimated_pages', 'estimated_activities', 'pages', 'games']:
+                status[field] += int(progress.get(field, 0))
+        status['remaining'] = len(await self.pending(redis) & set(member_ids))
+        return status
+
+    async def _finish(self, redis, member_id):
+        # The progress is kept until it expires so the final totals can still be reported
+        transaction = redis.multi_exec()
+        transaction.hdel(self.members_key, member_id)
+        transaction.expire(self._progress_key(member_id), constants.BACKFILL_PROGRESS_TTL)
+        await transaction.execute()
+
+    async def give_up(self, redis, member_id):
+        """Stop importing a member, leaving their history to the regular scans"""
+        if not await redis.hexists(self.members_key, member_id):
+            return
+        log.error(f"Giving up on importing game history for member {member_id}")
+        await self._finish(redis, member_id)
+        metrics.incr(f"{self.name}.failed")
+
+    async def import_member(self, bot, member_index, member_db, count):
+        """Read every character's history a page at a time, storing the games on each page"""
+        platform_id = member_db.clanmember.platform_id
+        member_id, _ = parse_platform(member_db, platform_id)
+        progress_key = self._progress_key(member_db.id)
+        walks = [constants.MODE_NONE, *constants.HISTORY_MODE_FILTERS.keys()]
+
+        # Games from before the member joined can't be eligible, so there's no need to read that far
+        eligible_after = max(constants.FORSAKEN_RELEASE, bot.config.activity_cutoff, member_db.clanmember.join_date)
+
+        snapshot = await get_profile_snapshot(bot.destiny, bot.redis, member_id, platform_id, 'import_member')
+        for char_id in snapshot['characters'].keys():
+            field = f"character-{char_id}"
+            value = await bot.redis.hget(progress_key, field)
+            character = json.loads(value) if value else dict(
+                walk=0, page=0, newest=None, skipped=False, complete=False)
+
+            while not character['complete']:
+                mode = walks[character['walk']]
+                activities, walk_complete = await get_activity_history(
+                    bot.destiny, bot.redis, platform_id, member_id, char_id, count=count,
+                    mode=mode, first_page=character['page'], max_pages=1
+                )
+                for activity in activities:
+                    activity['characterId'] = int(char_id)
+
+                game_count = 0
+                if activities:
+                    # The unfiltered walk comes first, so it finds the newest activity
+                    if not character['newest']:
+                        character['newest'] = [activities[0]['activityDetails']['instanceId'], activities[0]['period']]
+                    game_count, skipped_char_ids = await store_scanned_games(
+                        member_index, bot, [(member_db, activities, None)])
+                    character['skipped'] = character['skipped'] or bool(skipped_char_ids[member_db.id])
+                    walk_complete = walk_complete or bungie_date_as_utc(activities[-1]['period']) < eligible_after
+
+                character['page'] += 1
+                if walk_complete and mode == constants.MODE_NONE:
+                    character['complete'] = True
+                elif walk_complete or (
+                        mode == constants.MODE_NONE and character['page'] >= constants.HISTORY_FILTER_AFTER_PAGES):
+                    character['walk'] += 1
+                    character['page'] = 0
+                    character['complete'] = character['walk'] >= len(walks)
+
+                transaction = bot.redis.multi_exec()
+                transaction.hset(progress_key, field, json.dumps(character))
+                transaction.hincrby(progress_key, 'pages', 1)
+                transaction.hincrby(progress_key, 'games', game_count)
+                transaction.expire(progress_key, constants.BACKFILL_PROGRESS_TTL)
+                await transaction.execute()
+                metrics.incr(f"{self.name}.pages")
+
+            # Games that couldn't be stored are left for a full scan to retry, which
+            # happens as long as the character has no cursor
+            if character['newest'] and not character['skipped']:
+                instance_id, date = character['newest']
+                await bot.database.set_character_cursor(member_db, int(char_id), int(instance_id),
+                                                        bungie_date_as_utc(date))
+
+    async def run_member(self, bot, member_id, clan_id, count):
+        """Run or resume a member's import"""
+        member_dbs = await bot.database.execute(
+            Member.select(Member, ClanMember).join(ClanMember).join(Clan).where(
+                (Member.id == member_id) & (Clan.clan_id == clan_id)
+            )
+        )
+        if not member_dbs:
+            log.info(f"Skipping game history for member {member_id} who is no longer in clan {clan_id}")
+            await self._finish(bot.redis, member_id)
+            return
+
+        clan_member_dbs = await bot.database.get_clan_members([clan_id])
+        try:
+            await self.import_member(bot, MemberIndex(clan_member_dbs), member_dbs[0], count)
+        except (MaintenanceError, CircuitOpenError):
+            raise
+        except Exception:
+            attempts = await bot.redis.hincrby(self._progress_key(member_id), 'attempts', 1)
+            if attempts >= self.max_attempts:
+                await self.give_up(bot.redis, member_id)
+            raise
+
+        await self._finish(bot.redis, member_id)
+        metrics.incr(f"{self.name}.completed")
+        log.info(f"Imported game history for member {member_id}")
+
+    def _put(self, member_id):
+        if member_id not in self._queued:
+            self._queued.add(member_id)
+            self._queue.put_nowait(member_id)
+
+    async def _work(self, bot):
+        while True:
+            member_id = await self._queue.get()
+            self._queued.discard(member_id)
+            value = await bot.redis.hget(self.members_key, member_id)
+            if not value:
+                continue
+            member = json.loads(value)
+
+            try:
+                await self.run_member(bot, member_id, member['clan_id'], member['count'])
+            except (MaintenanceError, CircuitOpenError) as e:
+                log.info(f"Pausing game history import for member {member_id}: {e}")
+            except Exception:
+                log.exception(f"Could not import game history for member {member_id}")
+            else:
+                continue
+
+            # Failed imports go to the back of the queue unless they were given up on
+            await asyncio.sleep(constants.TIME_MIN_SECONDS)
+            if await bot.redis.hexists(self.members_key, member_id):
+                self._put(member_id)
+
+    async def start(self, bot):
+        """Run imports in this process, picking up any left unfinished by a restart"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.ensure_future(self._work(bot)) for _ in range(self.concurrency)]
+
+        pending = await self.pending(bot.redis)
+        if pending:
+            log.info(f"Resuming game history imports for {len(pending)} members")
+        for member_id in sorted(pending):
+            self._put(member_id)
+
+
+history_backfill = HistoryBackfill()
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_HALF_OPEN = 'half-open'
+STATE_OPEN = 'open'
+
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitBreaker(object):
+    """Fail fast on an endpoint family after repeated failures"""
+
+    def __init__(self, name, threshold, reset_timeout):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._changed_at = 0
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        log.warning(f"Circuit breaker for Bungie {self.name} endpoints is now {state}")
+        self.state = state
+        self._changed_at = asyncio.get_event_loop().time()
+        metrics.gauge(f"bungie-breaker.{self.name}", STATE_VALUES[state])
+
+    def _timed_out(self):
+        return asyncio.get_event_loop().time() - self._changed_at >= self.reset_timeout
+
+    @property
+    def available(self):
+        """Whether a call made now would be let through"""
+        return self.state == STATE_CLOSED or self._timed_out()
+
+    def allow(self):
+        if self.state == STATE_CLOSED:
+            return True
+        if self._timed_out():
+            self._set_state(STATE_HALF_OPEN)
+            # Restart the timer so only one probe goes out per timeout
+            self._changed_at = asyncio.get_event_loop().time()
+            return True
+        metrics.incr(f"bungie-breaker.{self.name}.rejected")
+        return False
+
+    def on_success(self):
+        self.failures = 0
+        self._set_state(STATE_CLOSED)
+
+    def on_failure(self):
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN or self.failures >= self.threshold:
+            self._set_state(STATE_OPEN)
+            # Reset the timer even if the breaker was already open
+            self._changed_at = asyncio.get_event_loop().time()
+
+
+class CircuitBreakers(object):
+    """One circuit breaker per endpoint family"""
+
+    def __init__(self, families, threshold, reset_timeout):
+        self.families = families
+        self.breakers = {
+            family: CircuitBreaker(family, threshold, reset_timeout)
+            for family in set(families.values())
+        }
+
+    def get(self, endpoint):
+        family = self.families.get(endpoint)
+        return self.breakers.get(family)
+
+    def available(self, *families):
+        return all(self.breakers[family].available for family in families)
@@ -0,0 +1,140 @@
+import json
+import logging
+import time
+import zlib
+
+from seraphsix import constants
+from seraphsix.metrics import metrics
+from seraphsix.models.destiny import reduce_pgcr
+
+log = logging.getLogger(__name__)
+
+# Store a value in the cache hash, mark it as most recently used and then evict
+# least recently used entries until the total stored size is within the limit.
+# KEYS: data hash, recency sorted set, size counter
+# ARGV: field, value, now, max bytes
+CACHE_SET_SCRIPT = """
+local previous = redis.call('HSTRLEN', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+local size = redis.call('INCRBY', KEYS[3], string.len(ARGV[2]) - previous)
+local evicted = 0
+while size > tonumber(ARGV[4]) do
+    local oldest = redis.call('ZRANGE', KEYS[2], 0, 0)
+    if #oldest == 0 then
+        break
+    end
+    size = redis.call('DECRBY', KEYS[3], redis.call('HSTRLEN', KEYS[1], oldest[1]))
+    redis.call('HDEL', KEYS[1], oldest[1])
+    redis.call('ZREM', KEYS[2], oldest[1])
+    evicted = evicted + 1
+end
+return evicted
+"""
+
+
+class PgcrCache(object):
+    """Redis-backed LRU cache of reduced, compressed PGCRs, and of games rejected per set of clans"""
+
+    def __init__(self, max_bytes=constants.PGCR_CACHE_MAX_BYTES, name='pgcr-cache'):
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _record(self, hit):
+        if hit:
+            self.hits += 1
+            metrics.incr(f"{self.name}.hits")
+        else:
+            self.misses += 1
+            metrics.incr(f"{self.name}.misses")
+        metrics.gauge(f"{self.name}.hit_rate", self.hit_rate)
+
+    async def get(self, redis, instance_id):
+        value = await redis.hget(f"{self.name}-data", instance_id)
+        self._record(value is not None)
+        if value is None:
+            return None
+        await redis.zadd(f"{self.name}-lru", time.time(), instance_id)
+        return json.loads(zlib.decompress(value))
+
+    async def set(self, redis, instance_id, pgcr):
+        pgcr = reduce_pgcr(pgcr)
+        value = zlib.compress(json.dumps(pgcr, separators=(',', ':')).encode('utf-8'))
+        evicted = await redis.eval(
+            CACHE_SET_SCRIPT,
+            keys=[f"{self.name}-data", f"{self.name}-lru", f"{self.name}-size"],
+            args=[instance_id, value, time.time(), self.max_bytes]
+        )
+        if evicted:
+            metrics.incr(f"{self.name}.evictions", evicted)
+        return pgcr
+
+    async def reject(self, redis, instance_id, scope):
+        key = f"{self.name}-rejected-{scope}"
+        await redis.zadd(key, time.time(), instance_id)
+        await redis.zremrangebyrank(key, 0, -constants.PGCR_REJECTED_MAX - 1)
+
+    async def is_rejected(self, redis, instance_id, scope):
+        rejected = await redis.zscore(f"{self.name}-rejected-{scope}", instance_id) is not None
+        if rejected:
+            metrics.incr(f"{self.name}.rejected_skips")
+        return rejected
+
+
+class ResponseCache(object):
+    """Redis-backed cache of Bungie API responses driven by a per-endpoint policy table"""
+
+    def __init__(self, policies, name='pydest-cache'):
+        self.policies = policies
+        self.name = name
+
+    def policy(self, endpoint):
+        return self.policies.get(endpoint)
+
+    async def get(self, redis, key, policy):
+        value = await redis.get(f"{self.name}-{key}")
+        if value is None:
+            metrics.incr(f"{self.name}.misses")
+            return None, False
+
+        entry = json.loads(value)
+        fresh = time.time() - entry['fetched'] < policy['ttl']
+        metrics.incr(f"{self.name}.{'hits' if fresh else 'stale_hits'}")
+        return entry['data'], fresh
+
+    async def set(self, redis, key, data, policy):
+        value = json.dumps({'fetched': time.time(), 'data': data}, separators=(',', ':'))
+        await redis.set(f"{self.name}-{key}", value, expire=policy['ttl'] + policy.get('stale', 0))
+
+
+class ProfileSnapshots(object):
+    """Short-lived Redis snapshots of the parts of a member's profile that background jobs need"""
+
+    def __init__(self, ttl=constants.PROFILE_SNAPSHOT_TTL, name='profile-snapshot'):
+        self.ttl = ttl
+        self.name = name
+
+    async def get(self, redis, platform_id, member_id):
+        value = await redis.get(f"{self.name}-{platform_id}-{member_id}")
+        metrics.incr(f"{self.name}.{'misses' if value is None else 'hits'}")
+        if value is None:
+            return None
+        return json.loads(value)
+
+    async def set(self, redis, platform_id, member_id, characters):
+        snapshot = {
+            'characters': {
+                character_id: character['dateLastPlayed']
+                for character_id, character in characters.items()
+            }
+        }
+        value = json.dumps(snapshot, separators=(',', ':'))
+        await redis.set(f"{self.name}-{platform_id}-{member_id}", value, expire=self.ttl)
+        return snapshot
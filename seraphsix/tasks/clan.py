@@ -1,11 +1,15 @@
 import asyncio
+import functools
 import logging
 
 from peewee import DoesNotExist
 from seraphsix import constants
 from seraphsix.database import Member as MemberDb, ClanMember, Clan
 from seraphsix.models.destiny import Member
-from seraphsix.tasks.activity import execute_pydest, store_member_history
+from seraphsix.tasks.activity import execute_pydest
+from seraphsix.tasks.backfill import history_backfill
+from seraphsix.tasks.jobs import job_queue
+from seraphsix.tasks.pipeline import Pipeline, Stage
 
 log = logging.getLogger(__name__)
 
@@ -64,11 +68,26 @@ async def get_database_members(database, clan_id):
     return members
 
 
+async def queue_member_history(bot, new_member):
+    member_db, clan_id = new_member
+    try:
+        await history_backfill.add(bot, member_db, clan_id)
+        if bot.config.enable_job_queue:
+            await job_queue.enqueue(
+                bot.redis, 'member-history', f"member-history-{member_db.id}",
+                member_id=member_db.id, clan_id=clan_id, count=constants.BACKFILL_PAGE_SIZE)
+    except Exception:
+        # The member is already added, so don't let one failure stop the others being queued
+        log.exception(f"Could not queue game history import for member {member_db.id}")
+        return
+    return new_member
+
+
 async def member_sync(bot, guild_id):  # noqa
     clan_dbs = await bot.database.get_clans_by_guild(guild_id)
     member_changes = {}
     for clan_db in clan_dbs:
-        member_changes[clan_db.clan_id] = {'added': [], 'removed': [], 'changed': []}
+        member_changes[clan_db.clan_id] = {'added': [], 'removed': [], 'changed': [], 'imported': []}
 
     bungie_members = {}
     db_members = {}
@@ -102,6 +121,7 @@ async def member_sync(bot, guild_id):  # noqa
 
     # Figure out if there are any members to add
     members_added = bungie_member_set - db_member_set
+    new_members = []
     for member_hash in members_added:
         member_info = bungie_members[member_hash]
         clan_id, platform_id, member_id = map(int, member_hash.split('-'))
@@ -128,14 +148,19 @@ async def member_sync(bot, guild_id):  # noqa
             )
         )
 
-        # Kick off activity scans for each of the added members
         # Indexing `clan_member_db` is necessary becuase the query returns a multi-row set, and
         # normal means of limiting that output (ie. `.get()`) does not work for some reason.
-        member_dbs = await bot.database.get_clan_members([clan_id])
-        asyncio.create_task(store_member_history(member_dbs, bot, clan_member_db[0], count=250))
-
+        new_members.append((clan_member_db[0], clan_id))
         member_changes[clan_db.clan_id]['added'].append(member_hash)
 
+    # Queue the added members' game histories to be imported a few members at a
+    # time, estimating the work for each one first
+    backfill_pipeline = Pipeline('backfill', [
+        Stage('estimate', functools.partial(queue_member_history, bot), constants.INGEST_WORKERS['history']),
+    ], constants.INGEST_QUEUE_SIZE)
+    for member_db, clan_id in await backfill_pipeline.run(new_members):
+        member_changes[clan_id]['imported'].append(member_db.id)
+
     # Figure out if there are any members to remove
     members_removed = db_member_set - bungie_member_set
     for member_hash in members_removed:
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class AdaptiveLimit(object):
+    """Additive-increase/multiplicative-decrease controller for request concurrency"""
+
+    def __init__(self, name, initial, minimum, maximum, latency_target,
+                 decrease=0.5, cooldown=5, smoothing=0.2):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.latency = 0.0
+        self.throttled_until = 0
+        self._last_decrease = 0
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+        listener(self)
+
+    def _changed(self):
+        metrics.gauge(f"{self.name}.limit", self.limit)
+        for listener in self._listeners:
+            listener(self)
+
+    def _shrink(self, reason):
+        now = asyncio.get_event_loop().time()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        limit = max(self.minimum, self.limit * self.decrease)
+        if limit != self.limit:
+            log.info(f"Lowering {self.name} limit from {self.limit:0.1f} to {limit:0.1f} after {reason}")
+            self.limit = limit
+            self._changed()
+        metrics.incr(f"{self.name}.decreases")
+
+    def on_success(self, latency, throttle_seconds=0):
+        self.latency = self.smoothing * latency + (1 - self.smoothing) * self.latency
+        metrics.gauge(f"{self.name}.latency", self.latency)
+
+        if throttle_seconds:
+            self.throttle(throttle_seconds)
+        elif self.latency > self.latency_target:
+            self._shrink(f"average latency of {self.latency:0.1f} seconds")
+        elif self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._changed()
+
+    def on_failure(self, reason):
+        metrics.incr(f"{self.name}.failures")
+        self._shrink(reason)
+
+    def throttle(self, seconds):
+        loop = asyncio.get_event_loop()
+        self.throttled_until = max(self.throttled_until, loop.time() + seconds)
+        metrics.incr(f"{self.name}.throttles")
+        self._shrink(f"a {seconds} second throttle")
+
+    async def wait(self):
+        delay = self.throttled_until - asyncio.get_event_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
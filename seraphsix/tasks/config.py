@@ -3,6 +3,7 @@ import pytz
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from get_docker_secret import get_docker_secret
+from seraphsix import constants
 
 
 @dataclass
@@ -46,11 +47,33 @@ class TwitterConfig:
         return asdict(self)
 
 
+@dataclass
+class HttpConfig:
+    limit: int
+    limit_per_host: int
+    keepalive_timeout: int
+    dns_cache_ttl: int
+
+    def __init__(self):
+        self.limit = get_docker_secret(
+            'http_max_connections', default=constants.HTTP_MAX_CONNECTIONS, cast_to=int)
+        self.limit_per_host = get_docker_secret(
+            'http_max_connections_per_host', default=constants.HTTP_MAX_CONNECTIONS_PER_HOST, cast_to=int)
+        self.keepalive_timeout = get_docker_secret(
+            'http_keepalive_timeout', default=constants.HTTP_KEEPALIVE_TIMEOUT, cast_to=int)
+        self.dns_cache_ttl = get_docker_secret(
+            'http_dns_cache_ttl', default=constants.HTTP_DNS_CACHE_TTL, cast_to=int)
+
+    def asdict(self):
+        return asdict(self)
+
+
 @dataclass
 class Config:
     bungie: BungieConfig
     the100: The100Config
     twitter: TwitterConfig
+    http: HttpConfig
     database_url: str
     discord_api_key: str
     redis_url: str
@@ -59,6 +82,9 @@ class Config:
     reg_channel: int
     enable_activity_tracking: bool
     activity_cutoff: str
+    pgcr_cache_size: int
+    fast_json: bool
+    enable_job_queue: bool
 
     def __init__(self):
         database_user = get_docker_secret('seraphsix_pg_db_user', default='seraphsix')
@@ -78,6 +104,7 @@ class Config:
         self.bungie = BungieConfig()
         self.the100 = The100Config()
         self.twitter = TwitterConfig()
+        self.http = HttpConfig()
         self.discord_api_key = get_docker_secret('discord_api_key')
         self.home_server = get_docker_secret('home_server', cast_to=int)
         self.log_channel = get_docker_secret('home_server_log_channel', cast_to=int)
@@ -86,3 +113,8 @@ class Config:
 
         activity_cutoff = get_docker_secret('activity_cutoff')
         self.activity_cutoff = datetime.strptime(activity_cutoff, '%Y-%m-%d').astimezone(tz=pytz.utc)
+
+        self.pgcr_cache_size = get_docker_secret(
+            'pgcr_cache_size', default=constants.PGCR_CACHE_MAX_BYTES, cast_to=int)
+        self.fast_json = get_docker_secret('fast_json_decoding', default=False, cast_to=bool)
+        self.enable_job_queue = get_docker_secret('enable_job_queue', default=False, cast_to=bool)
@@ -0,0 +1,42 @@
+import logging
+
+from seraphsix.tasks.activity import store_all_games, store_all_last_active
+from seraphsix.tasks.backfill import history_backfill
+from seraphsix.tasks.queue import RedisJobQueue
+
+log = logging.getLogger(__name__)
+
+job_queue = RedisJobQueue('ingest-jobs')
+
+
+async def run_last_active(bot, guild_id):
+    member_dbs = await bot.database.get_clan_members_by_guild_id(guild_id)
+    await store_all_last_active(bot, member_dbs)
+
+
+async def run_store_games(bot, guild_id, full_rescan=False):
+    importing = await history_backfill.pending(bot.redis)
+    await store_all_games(bot, guild_id, full_rescan=full_rescan, skip_member_ids=importing)
+
+
+async def run_member_history(bot, member_id, clan_id, count):
+    await history_backfill.run_member(bot, member_id, clan_id, count)
+
+
+async def drop_member_history(bot, member_id, clan_id, count):
+    await history_backfill.give_up(bot.redis, member_id)
+
+
+# Every handler is safe to run more than once for the same job: games are
+# upserted, cursors and last active dates are simply overwritten, and history
+# imports carry on from their last stored page
+JOB_HANDLERS = {
+    'last-active': run_last_active,
+    'store-games': run_store_games,
+    'member-history': run_member_history,
+}
+
+# Clean up after jobs that have been given up on
+JOB_FAILURE_HANDLERS = {
+    'member-history': drop_member_history,
+}
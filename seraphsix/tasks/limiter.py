@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import random
+
+from aioredis.errors import ReplyError
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# Refill every bucket named in KEYS at the rate in the matching ARGV slot, then
+# take one token from each of them. Tokens are only taken when every bucket has
+# one available, otherwise the longest wait (in seconds) is returned. Redis time
+# is used so that all processes share the same clock.
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local wait = 0
+local buckets = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i])
+    local capacity = math.max(rate, 1)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+    buckets[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    local tokens = buckets[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HMSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, 60)
+end
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket(object):
+    """Token bucket rate limiter shared by every process using the same Redis server"""
+
+    def __init__(self, name, rate, endpoint_rates=None):
+        self.name = name
+        self.rate = rate
+        self.endpoint_rates = endpoint_rates or {}
+        self._script_sha = None
+
+    def _buckets(self, endpoint):
+        keys = [f"{self.name}-global"]
+        rates = [self.rate]
+        if endpoint in self.endpoint_rates:
+            keys.append(f"{self.name}-{endpoint}")
+            rates.append(self.endpoint_rates[endpoint])
+        return keys, rates
+
+    async def _take(self, redis, keys, rates):
+        if not self._script_sha:
+            self._script_sha = await redis.script_load(TOKEN_BUCKET_SCRIPT)
+        try:
+            wait = await redis.evalsha(self._script_sha, keys=keys, args=rates)
+        except ReplyError as e:
+            if not str(e).startswith('NOSCRIPT'):
+                raise
+            # The script cache was flushed, likely by a Redis restart
+            self._script_sha = None
+            return await self._take(redis, keys, rates)
+        return float(wait)
+
+    async def acquire(self, redis, endpoint=None):
+        keys, rates = self._buckets(endpoint)
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+
+        wait = await self._take(redis, keys, rates)
+        while wait:
+            # Jitter the sleep so waiting callers don't all retry at the same instant
+            await asyncio.sleep(wait + random.uniform(0, wait))
+            wait = await self._take(redis, keys, rates)
+
+        waited = loop.time() - started
+        metrics.incr(f"{self.name}.calls")
+        metrics.observe(f"{self.name}.wait", waited)
+        if endpoint:
+            metrics.observe(f"{self.name}.wait.{endpoint}", waited)
+        return waited
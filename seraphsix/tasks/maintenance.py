@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import pydest
+
+from seraphsix import constants
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class MaintenanceGate(object):
+    """Process-local view of whether Bungie is undergoing maintenance, kept in sync over Redis pub/sub"""
+
+    def __init__(self, channel='global-bungie-maintenance', duration=constants.TIME_MIN_SECONDS):
+        self.channel = channel
+        self.duration = duration
+        self._until = 0
+        self._tasks = []
+
+    @property
+    def active(self):
+        return asyncio.get_event_loop().time() < self._until
+
+    def _set(self, active):
+        was_active = self.active
+        if active:
+            self._until = asyncio.get_event_loop().time() + self.duration
+        else:
+            self._until = 0
+        if was_active != active:
+            log.info(f"Bungie maintenance {'started' if active else 'ended'}")
+        metrics.gauge('bungie.maintenance', int(active))
+
+    async def enable(self, redis):
+        self._set(True)
+        await redis.set(self.channel, str(True), expire=self.duration)
+        await redis.publish(self.channel, str(True))
+
+    async def disable(self, redis):
+        self._set(False)
+        await redis.delete(self.channel)
+        await redis.publish(self.channel, str(False))
+
+    async def start(self, redis, destiny, interval=constants.TIME_MIN_SECONDS / 2):
+        if self._tasks:
+            return
+
+        # Pick up maintenance announced before this process started
+        ttl = await redis.ttl(self.channel)
+        if ttl > 0:
+            self._until = asyncio.get_event_loop().time() + ttl
+
+        channel, = await redis.subscribe(self.channel)
+        self._tasks = [
+            asyncio.create_task(self._listen(channel)),
+            asyncio.create_task(self._probe(redis, destiny, interval))
+        ]
+
+    async def stop(self, redis):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await redis.unsubscribe(self.channel)
+
+    async def _listen(self, channel):
+        while (await channel.wait_message()):
+            message = await channel.get(encoding='utf-8')
+            self._set(message == str(True))
+
+    async def _probe(self, redis, destiny, interval):
+        while True:
+            await asyncio.sleep(interval)
+            if not self.active:
+                continue
+            try:
+                res = await destiny.api.get_destiny_manifest()
+            except pydest.pydest.PydestMaintenanceException:
+                await self.enable(redis)
+            except Exception:
+                log.exception("Bungie maintenance probe failed")
+            else:
+                if res.get('ErrorCode') == 1:
+                    await self.disable(redis)
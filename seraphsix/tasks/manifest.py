@@ -0,0 +1,173 @@
+import aiohttp
+import asyncio
+import glob
+import json
+import logging
+import os
+import sqlite3
+import zipfile
+
+from collections import OrderedDict
+from seraphsix import constants
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+BUNGIE_URL = 'https://www.bungie.net'
+
+
+def to_signed_hash(hash_id):
+    """Convert a definition hash to the signed 32 bit id the manifest database is keyed by"""
+    hash_id = int(hash_id)
+    if hash_id & (1 << 31):
+        hash_id -= 1 << 32
+    return hash_id
+
+
+def extract_content(archive_name, content_name):
+    """Extract the content database from a manifest archive, replacing the file in one step"""
+    partial_name = f"{content_name}.partial"
+    with zipfile.ZipFile(archive_name) as archive:
+        member = archive.namelist()[0]
+        with archive.open(member) as source, open(partial_name, 'wb') as target:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                target.write(chunk)
+    os.replace(partial_name, content_name)
+    os.remove(archive_name)
+
+
+def open_content(content_name):
+    # Lookups then read straight from the memory-mapped file instead of copying pages in
+    connection = sqlite3.connect(f"file:{content_name}?mode=ro", uri=True, check_same_thread=False)
+    connection.execute(f"PRAGMA mmap_size={constants.MANIFEST_MMAP_SIZE}")
+    return connection
+
+
+class ManifestStore(object):
+    """Local copy of the Destiny manifest content database"""
+
+    def __init__(self, path=constants.MANIFEST_PATH, check_interval=constants.MANIFEST_CHECK_INTERVAL,
+                 cache_size=constants.MANIFEST_CACHE_SIZE, language='en', name='manifest'):
+        self.path = path
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self.language = language
+        self.name = name
+        self.version = None
+        self._connection = None
+        self._checked = None
+        self._lock = None
+        self._definitions = OrderedDict()
+
+    def _due(self):
+        loop = asyncio.get_event_loop()
+        return self._checked is None or loop.time() - self._checked >= self.check_interval
+
+    def _switch(self, content_name, version):
+        connection = open_content(content_name)
+        if self._connection:
+            self._connection.close()
+        self._connection = connection
+        self.version = version
+        self._definitions.clear()
+        log.info(f"Using Destiny manifest {content_name}")
+
+    def _open_latest(self):
+        # Fall back to whichever copy was downloaded last when Bungie can't be reached
+        content_names = glob.glob(os.path.join(self.path, '*.content'))
+        if content_names:
+            self._switch(max(content_names, key=os.path.getmtime), None)
+
+    async def _download(self, session, url, content_name):
+        archive_name = f"{content_name}.zip"
+        timeout = aiohttp.ClientTimeout(total=constants.MANIFEST_DOWNLOAD_TIMEOUT)
+        async with session.get(url, timeout=timeout) as response:
+            response.raise_for_status()
+            with open(archive_name, 'wb') as archive:
+                async for chunk in response.content.iter_chunked(1024 * 1024):
+                    archive.write(chunk)
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, extract_content, archive_name, content_name)
+        metrics.incr(f"{self.name}.downloads")
+
+    async def update(self, session, get_manifest):
+        """Switch to the latest manifest version if it hasn't been checked for a while"""
+        if not self._due():
+            return
+        if not self._lock:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self._due():
+                return
+            self._checked = asyncio.get_event_loop().time()
+
+            try:
+                manifest = await get_manifest()
+                version = manifest['version']
+                if version == self.version:
+                    return
+
+                content_path = manifest['mobileWorldContentPaths'][self.language]
+                content_name = os.path.join(self.path, os.path.basename(content_path))
+                if not os.path.isfile(content_name):
+                    log.info(f"Downloading Destiny manifest version {version}")
+                    os.makedirs(self.path, exist_ok=True)
+                    await self._download(session, f"{BUNGIE_URL}{content_path}", content_name)
+                self._switch(content_name, version)
+            except Exception as e:
+                log.error(f"Could not update the Destiny manifest: {e!r}")
+                if not self._connection:
+                    self._open_latest()
+                return
+
+            # Older versions are no longer needed once the new one is open
+            for old_name in glob.glob(os.path.join(self.path, '*.content')):
+                if old_name != content_name:
+                    os.remove(old_name)
+
+    def decode_many(self, hashes, definition='DestinyActivityDefinition'):
+        """Get the definitions for several hashes, mapped by hash"""
+        if not definition.isidentifier():
+            raise ValueError(f"Invalid definition {definition}")
+
+        definitions = {}
+        missing = []
+        for hash_id in set(int(hash_id) for hash_id in hashes):
+            key = (definition, hash_id)
+            if key in self._definitions:
+                self._definitions.move_to_end(key)
+                definitions[hash_id] = self._definitions[key]
+            else:
+                missing.append(hash_id)
+        metrics.incr(f"{self.name}.hits", len(definitions))
+        metrics.incr(f"{self.name}.misses", len(missing))
+
+        if not missing or not self._connection:
+            return definitions
+
+        # Stay well under SQLite's limit on the number of query parameters
+        for start in range(0, len(missing), constants.MANIFEST_QUERY_BATCH_SIZE):
+            batch = [to_signed_hash(hash_id) for hash_id in missing[start:start + constants.MANIFEST_QUERY_BATCH_SIZE]]
+            placeholders = ','.join('?' * len(batch))
+            rows = self._connection.execute(
+                f"SELECT id, json FROM {definition} WHERE id IN ({placeholders})", batch)
+            for row_id, value in rows:
+                hash_id = row_id & 0xFFFFFFFF
+                definitions[hash_id] = self._definitions[(definition, hash_id)] = json.loads(value)
+
+        while len(self._definitions) > self.cache_size:
+            self._definitions.popitem(last=False)
+        return definitions
+
+    def decode(self, hash_id, definition='DestinyActivityDefinition'):
+        return self.decode_many([hash_id], definition).get(int(hash_id))
+
+    def close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
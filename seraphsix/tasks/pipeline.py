@@ -0,0 +1,81 @@
+import asyncio
+import logging
+
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class Stage(object):
+    """One step of a pipeline, run by a fixed number of workers"""
+
+    def __init__(self, name, handler, workers=1, batch_size=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+
+
+class Pipeline(object):
+    """Run items through a chain of stages connected by bounded queues, stopping if any handler raises"""
+
+    def __init__(self, name, stages, queue_size):
+        self.name = name
+        self.stages = stages
+        self.queue_size = queue_size
+
+    async def _work(self, stage, queue, output, results):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await queue.get()]
+            while stage.batch_size and len(batch) < stage.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            metrics.gauge(f"{self.name}.{stage.name}.queued", queue.qsize())
+
+            try:
+                started = loop.time()
+                result = await stage.handler(batch if stage.batch_size else batch[0])
+                metrics.observe(f"{self.name}.{stage.name}.time", loop.time() - started)
+                metrics.incr(f"{self.name}.{stage.name}.processed", len(batch))
+                if result is None:
+                    metrics.incr(f"{self.name}.{stage.name}.dropped", len(batch))
+                elif output:
+                    await output.put(result)
+                else:
+                    results.append(result)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _feed(self, items, queues):
+        for item in items:
+            await queues[0].put(item)
+        # Each stage only finishes adding to the next queue once its own queue is drained
+        for queue in queues:
+            await queue.join()
+
+    async def run(self, items):
+        """Feed items through every stage and return the results of the last one"""
+        queues = [asyncio.Queue(self.queue_size) for _ in self.stages]
+        outputs = queues[1:] + [None]
+        results = []
+
+        workers = [
+            asyncio.ensure_future(self._work(stage, queue, output, results))
+            for stage, queue, output in zip(self.stages, queues, outputs)
+            for _ in range(stage.workers)
+        ]
+        feeder = asyncio.ensure_future(self._feed(items, queues))
+
+        try:
+            # Workers only ever finish by raising, so stop at whichever task finishes first
+            await asyncio.wait([feeder, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for worker in workers:
+                if worker.done():
+                    worker.result()
+            feeder.result()
+        finally:
+            for task in [feeder, *workers]:
+                task.cancel()
+            await asyncio.gather(feeder, *workers, return_exceptions=True)
+        return results
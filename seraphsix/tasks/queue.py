@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+
+from seraphsix import constants
+from seraphsix.errors import CircuitOpenError, MaintenanceError
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# Add a job unless one with the same id is already pending or running
+ENQUEUE_SCRIPT = """
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Put jobs whose visibility timeout or retry delay has passed back on the
+# queue, then take the oldest pending job and hide it from other workers until
+# the timeout. Ids of jobs that were forgotten while their id was still queued
+# are dropped. Redis time is used so that all processes share the same clock.
+RESERVE_SCRIPT = """
+redis.replicate_commands()
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+for _, key in ipairs({KEYS[3], KEYS[5]}) do
+    local due = redis.call('ZRANGEBYSCORE', key, '-inf', now)
+    for _, job_id in ipairs(due) do
+        redis.call('ZREM', key, job_id)
+        redis.call('RPUSH', KEYS[2], job_id)
+    end
+end
+while true do
+    local job_id = redis.call('RPOP', KEYS[2])
+    if not job_id then
+        return nil
+    end
+    local data = redis.call('HGET', KEYS[1], job_id)
+    if data then
+        redis.call('ZADD', KEYS[3], now + tonumber(ARGV[1]), job_id)
+        local attempts = redis.call('HINCRBY', KEYS[4], job_id, 1)
+        return {job_id, data, attempts}
+    end
+    redis.call('HDEL', KEYS[4], job_id)
+end
+"""
+
+# Take a job off the running set and queue it again once a delay has passed,
+# adding ARGV[3] to its attempts
+DELAY_SCRIPT = """
+redis.replicate_commands()
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+redis.call('ZREM', KEYS[1], ARGV[1])
+if tonumber(ARGV[3]) ~= 0 then
+    redis.call('HINCRBY', KEYS[3], ARGV[1], ARGV[3])
+end
+return redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), ARGV[1])
+"""
+
+# Push back the visibility timeout of a job that is still running
+TOUCH_SCRIPT = """
+redis.replicate_commands()
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+return redis.call('ZADD', KEYS[1], 'XX', now + tonumber(ARGV[2]), ARGV[1])
+"""
+
+
+class Job(object):
+    def __init__(self, job_id, data, attempts):
+        data = json.loads(data)
+        self.id = job_id
+        self.type = data['type']
+        self.payload = data['payload']
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"<{type(self).__name__}: {self.id}>"
+
+
+class RedisJobQueue(object):
+    """Durable, at-least-once job queue shared by every process using the same Redis server"""
+
+    def __init__(self, name, visibility_timeout=constants.JOB_VISIBILITY_TIMEOUT,
+                 max_attempts=constants.JOB_MAX_ATTEMPTS, retry_delay=constants.JOB_RETRY_DELAY):
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.jobs_key = f"{name}-jobs"
+        self.pending_key = f"{name}-pending"
+        self.running_key = f"{name}-running"
+        self.delayed_key = f"{name}-delayed"
+        self.attempts_key = f"{name}-attempts"
+        self.failed_key = f"{name}-failed"
+
+    async def enqueue(self, redis, job_type, job_id, **payload):
+        data = json.dumps(dict(type=job_type, payload=payload))
+        added = await redis.eval(ENQUEUE_SCRIPT, keys=[self.jobs_key, self.pending_key], args=[job_id, data])
+        if added:
+            metrics.incr(f"{self.name}.enqueued.{job_type}")
+        else:
+            log.debug(f"Job {job_id} is already queued")
+        return bool(added)
+
+    async def reserve(self, redis):
+        result = await redis.eval(
+            RESERVE_SCRIPT,
+            keys=[self.jobs_key, self.pending_key, self.running_key, self.attempts_key, self.delayed_key],
+            args=[self.visibility_timeout])
+        if not result:
+            return
+        job_id, data, attempts = result
+        return Job(job_id.decode(), data, int(attempts))
+
+    async def touch(self, redis, job):
+        await redis.eval(TOUCH_SCRIPT, keys=[self.running_key], args=[job.id, self.visibility_timeout])
+
+    async def _forget(self, redis, job):
+        transaction = redis.multi_exec()
+        transaction.zrem(self.running_key, job.id)
+        transaction.hdel(self.jobs_key, job.id)
+        transaction.hdel(self.attempts_key, job.id)
+        await transaction.execute()
+
+    async def ack(self, redis, job):
+        await self._forget(redis, job)
+        metrics.incr(f"{self.name}.completed.{job.type}")
+
+    async def _delay(self, redis, job, delay, attempts=0):
+        await redis.eval(
+            DELAY_SCRIPT, keys=[self.running_key, self.delayed_key, self.attempts_key], args=[job.id, delay, attempts])
+
+    async def release(self, redis, job, delay=constants.JOB_RELEASE_DELAY):
+        """Put a job back on the queue after a short delay without counting the attempt"""
+        await self._delay(redis, job, delay, -1)
+
+    async def give_up(self, redis, job):
+        log.error(f"Job {job.id} failed {job.attempts} times, giving up")
+        await redis.lpush(self.failed_key, json.dumps(dict(id=job.id, type=job.type, payload=job.payload)))
+        await self._forget(redis, job)
+        metrics.incr(f"{self.name}.failed.{job.type}")
+
+    async def fail(self, redis, job):
+        """Retry a failed job, or give up on it after max_attempts, returning whether it was given up on"""
+        if job.attempts < self.max_attempts:
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            await self._delay(redis, job, delay)
+            log.info(f"Retrying job {job.id} in {delay} seconds")
+            metrics.incr(f"{self.name}.retried.{job.type}")
+            return False
+
+        await self.give_up(redis, job)
+        return True
+
+    async def record(self, redis):
+        metrics.gauge(f"{self.name}.pending", await redis.llen(self.pending_key))
+        metrics.gauge(f"{self.name}.running", await redis.zcard(self.running_key))
+        metrics.gauge(f"{self.name}.delayed", await redis.zcard(self.delayed_key))
+        metrics.gauge(f"{self.name}.failed", await redis.llen(self.failed_key))
+
+
+class JobWorker(object):
+    """Take jobs from a queue and run the handler registered for each job type"""
+
+    def __init__(self, queue, handlers, failure_handlers=None, concurrency=constants.JOB_WORKER_CONCURRENCY,
+                 poll_interval=constants.JOB_POLL_INTERVAL):
+        self.queue = queue
+        self.handlers = handlers
+        self.failure_handlers = failure_handlers or {}
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+
+    async def _heartbeat(self, redis, job):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            await self.queue.touch(redis, job)
+
+    async def _failed(self, context, job):
+        if job.type in self.failure_handlers:
+            await self.failure_handlers[job.type](context, **job.payload)
+
+    async def _run_job(self, context, redis, job):
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        heartbeat = asyncio.ensure_future(self._heartbeat(redis, job))
+        try:
+            handler = self.handlers[job.type]
+            await handler(context, **job.payload)
+        except (MaintenanceError, CircuitOpenError) as e:
+            # Neither is the job's fault, so wait for Bungie without using up an attempt
+            log.info(f"Putting job {job.id} back: {e}")
+            await self.queue.release(redis, job)
+        except Exception:
+            log.exception(f"Job {job.id} failed on attempt {job.attempts}")
+            if await self.queue.fail(redis, job):
+                await self._failed(context, job)
+        else:
+            await self.queue.ack(redis, job)
+            metrics.observe(f"{self.queue.name}.time.{job.type}", loop.time() - started)
+        finally:
+            heartbeat.cancel()
+
+    async def _work(self, context, redis):
+        while True:
+            job = await self.queue.reserve(redis)
+            if not job:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job.attempts > self.queue.max_attempts:
+                # Every earlier run was redelivered after its timeout, likely from crashing its worker
+                await self.queue.give_up(redis, job)
+                await self._failed(context, job)
+                continue
+            log.debug(f"Running job {job.id}")
+            await self._run_job(context, redis, job)
+
+    async def run(self, context, redis):
+        log.info(f"Running {self.concurrency} workers for {self.queue.name}")
+        await asyncio.gather(*[self._work(context, redis) for _ in range(self.concurrency)])
@@ -0,0 +1,71 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class PriorityScheduler(object):
+    """Limit concurrent requests, handing free slots out by priority"""
+
+    def __init__(self, name, limit, class_names=None):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.class_names = class_names or {}
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def set_limit(self, limit):
+        self.limit = limit
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.active < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.cancelled():
+                continue
+            self.active += 1
+            future.set_result(None)
+        metrics.gauge(f"{self.name}.queued", len(self._waiters))
+        metrics.gauge(f"{self.name}.active", self.active)
+
+    async def acquire(self, priority):
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+        else:
+            future = loop.create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+            metrics.gauge(f"{self.name}.queued", len(self._waiters))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # The slot may have been handed over just before the cancellation
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+
+        class_name = self.class_names.get(priority, priority)
+        metrics.observe(f"{self.name}.wait.{class_name}", loop.time() - started)
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
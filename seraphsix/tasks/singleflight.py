@@ -0,0 +1,34 @@
+import asyncio
+import functools
+import logging
+
+from seraphsix.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class SingleFlight(object):
+    """Coalesce concurrent calls that share a key into one execution with a shared result"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    async def do(self, key, factory):
+        future = self._calls.get(key)
+        if future:
+            metrics.incr(f"{self.name}.shared")
+        else:
+            future = asyncio.ensure_future(factory())
+            future.add_done_callback(functools.partial(self._forget, key))
+            self._calls[key] = future
+            metrics.incr(f"{self.name}.calls")
+        # Shield the shared call so one cancelled caller doesn't cancel it for the others
+        return await asyncio.shield(future)
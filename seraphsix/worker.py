@@ -0,0 +1,45 @@
+import aioredis
+import asyncio
+import logging
+
+from seraphsix.clients import HttpClients, create_destiny
+from seraphsix.database import Database
+from seraphsix.tasks.activity import bungie_maintenance
+from seraphsix.tasks.cache import PgcrCache
+from seraphsix.tasks.jobs import JOB_FAILURE_HANDLERS, JOB_HANDLERS, job_queue
+from seraphsix.tasks.queue import JobWorker
+
+log = logging.getLogger(__name__)
+
+
+class SeraphSixWorker(object):
+    """Runs queued ingestion jobs outside of the Discord gateway process
+
+    Provides the same database, Bungie client, Redis connection and PGCR cache
+    attributes as the bot, so job handlers can be given either one. Any number
+    of these can run alongside the bot to share the work.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.database = Database(config.database_url)
+        self.database.initialize()
+
+        self.http_clients = HttpClients(**config.http.asdict())
+        self.destiny = create_destiny(self.http_clients, config)
+        self.pgcr_cache = PgcrCache(config.pgcr_cache_size)
+
+    async def start(self):
+        self.redis = await aioredis.create_redis_pool(self.config.redis_url)
+        await bungie_maintenance.start(self.redis, self.destiny)
+        try:
+            await JobWorker(job_queue, JOB_HANDLERS, JOB_FAILURE_HANDLERS).run(self, self.redis)
+        finally:
+            await self.destiny.close()
+            await self.http_clients.close()
+            await self.database.close()
+            self.redis.close()
+            await self.redis.wait_closed()
+
+    def run(self):
+        asyncio.get_event_loop().run_until_complete(self.start())
@@ -0,0 +1,33 @@
+import logging
+import warnings
+
+from seraphsix.constants import LOG_FORMAT_MSG, BUNGIE_DATE_FORMAT
+from seraphsix.tasks.config import Config
+from seraphsix.utils import UTCFormatter
+from seraphsix.worker import SeraphSixWorker
+
+warnings.filterwarnings('ignore', category=UserWarning, module='psycopg2')
+
+
+def main():
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler()
+    formatter = UTCFormatter(fmt=LOG_FORMAT_MSG, datefmt=BUNGIE_DATE_FORMAT)
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+    logging.getLogger('aiohttp.client').setLevel(logging.ERROR)
+
+    log = logging.getLogger(__name__)
+
+    try:
+        config = Config()
+        worker = SeraphSixWorker(config)
+        worker.run()
+    except Exception:
+        log.exception("Caught exception")
+
+
+if __name__ == '__main__':
+    main()